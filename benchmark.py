@@ -0,0 +1,219 @@
+"""
+This is an external file, not used in the project, to measure the performance of parts of the project.
+Run it with the name of a benchmark, e.g. "python benchmark.py durability", or without one to run all.
+
+Benchmarks:
+- durability: Commit latency of the SQLManager for every profile of SQL_DURABILITY_PROFILES.
+- features: Per-row apply against the vectorized feature derivation of the PlotManager (productivity, activity, encoding).
+- dates: strftime labels per row against datetime64 buckets (labels only per group) for the date column of the plots.
+- parsing: Parse time and resident memory of the tracker history, with default dtypes against the CSV_SCHEMA.
+- downsampling: Drawing time of dense scatter plots, with all points against the LTTB downsampled series.
+- rendering: Drawing time of the prepared tracker plots in the seaborn against the fast (plain Matplotlib) render mode.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from csv_util import concat_frames, CSVWriter, read_typed_csv, TRACKER_FIELDNAMES
+from menu_settings import DROPDOWN_CONTENT
+from plot_settings import PLOT_RENDER_MODES
+from settings import ACTIVITY_LEVELS, SQL_DURABILITY_PROFILES, TABLE_COLUMNS
+from sql import SQLManager
+from util import (get_productivity_by_categories, get_productivity_by_category, map_activities, map_activity,
+                  one_hot_encode, PRODUCTIVITY_PER_CATEGORY)
+
+
+def benchmark_durability(commits=500):
+    """Measures the latency of small commits (one upserted row each, like a flush) for every durability profile."""
+    print(f"Commit latency ({commits} commits of one row):")
+    for durability in SQL_DURABILITY_PROFILES:
+        with tempfile.TemporaryDirectory() as directory:
+            db_manager = SQLManager(os.path.join(directory, "benchmark.db"), read_pool_size=0, durability=durability)
+            db_manager.create_table("benchmark", TABLE_COLUMNS)
+            db_manager.create_index("benchmark", ("app_name",), unique=True)
+
+            latencies = []
+            for i in range(commits):
+                start = time.perf_counter()
+                db_manager.upsert_object("benchmark", {"app_name": f"app{i % 20}.exe", "category": "Other",
+                                                       "activity": "active", "opened_time": i}, ("app_name",))
+                db_manager.checkpoint()
+                latencies.append(time.perf_counter() - start)
+            db_manager.close()
+
+        latencies.sort()
+        print(f"- {durability}: mean {statistics.mean(latencies) * 1000:.3f} ms, "
+              f"p50 {latencies[len(latencies) // 2] * 1000:.3f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms")
+
+
+def benchmark_features(rows=2_000_000):
+    """Measures the per-row apply (and dict based encoding) against the vectorized feature derivation on a frame of
+    string columns, like the CSV history is loaded."""
+    random = np.random.default_rng(0)
+    categories = np.array([category for key_set in PRODUCTIVITY_PER_CATEGORY for category in key_set] + ['other'])
+    data = pd.DataFrame({'category': categories[random.integers(0, len(categories), rows)],
+                         'activity': np.array(ACTIVITY_LEVELS)[random.integers(0, len(ACTIVITY_LEVELS), rows)]})
+
+    def encode_with_dict(df, column):
+        uniques = df[column].unique()
+        df[column] = df[column].map({uniques[i]: i for i in range(len(uniques))})
+        return df
+
+    cases = {"productivity": (lambda: data['category'].apply(get_productivity_by_category),
+                              lambda: get_productivity_by_categories(data['category'])),
+             "activity": (lambda: data['activity'].apply(map_activity), lambda: map_activities(data['activity'])),
+             "encoding": (lambda: encode_with_dict(data.copy(), 'category'),
+                          lambda: one_hot_encode(data.copy(), 'category'))}
+
+    print(f"Feature derivation ({rows} rows):")
+    for name, (applied, vectorized) in cases.items():
+        timings = []
+        for function in (applied, vectorized):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        print(f"- {name}: apply {timings[0] * 1000:.1f} ms, vectorized {timings[1] * 1000:.1f} ms "
+              f"({timings[0] / timings[1]:.1f}x)")
+
+
+def benchmark_parsing(rows=1_000_000):
+    """Measures parse time and resident memory of a tracker CSV file (about a year of history), read with the default
+    object dtypes and a format-less pd.to_datetime against the typed read_typed_csv. Like real files, some rows have
+    float times and an empty id."""
+    random = np.random.default_rng(0)
+    categories = [category for key_set in PRODUCTIVITY_PER_CATEGORY for category in key_set]
+    with tempfile.TemporaryDirectory() as directory:
+        csv_file = os.path.join(directory, "tracker.csv")
+        writer = CSVWriter(csv_file, TRACKER_FIELDNAMES, flush_size=rows)
+        start = int(time.time()) - rows * 30
+        writer.write_rows({"id": "" if i % 1000 == 0 else i % 200, "timestamp": start + i * 30,
+                           "app_name": f"app{i % 200}.exe", "category": categories[i % len(categories)],
+                           "activity": ACTIVITY_LEVELS[random.integers(0, len(ACTIVITY_LEVELS))],
+                           "opened_time": i, "active_time": i // 2,
+                           "total_active_time": i + 0.5 if i % 100 == 0 else i} for i in range(rows))
+        writer.close()
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".csv")]
+
+        def read_default():
+            data = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+            data['timestamp'] = pd.to_datetime(data['timestamp'])
+            return data
+
+        def read_typed():
+            return concat_frames([read_typed_csv(path) for path in paths])
+
+        print(f"Parsing ({rows} rows in {len(paths)} daily files):")
+        for name, function in (("default", read_default), ("typed", read_typed)):
+            start_time = time.perf_counter()
+            data = function()
+            duration = time.perf_counter() - start_time
+            print(f"- {name}: {duration * 1000:.1f} ms, {data.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MiB")
+
+
+def benchmark_dates(rows=2_000_000):
+    """Measures the date column of the Total Active Time plot (daily, summed per date and category) built with strftime
+    labels per row against datetime64 buckets, whose labels are only formatted for the grouped rows."""
+    random = np.random.default_rng(0)
+    start = np.datetime64('2024-01-01T00:00:00')
+    data = pd.DataFrame({'timestamp': start + np.sort(random.integers(0, 3 * 365 * 86400, rows)).astype('timedelta64[s]'),
+                         'category': pd.Categorical(random.choice(['coding', 'gaming', 'browser'], rows)),
+                         'total_active_time': random.integers(0, 3600, rows)})
+
+    def with_strings():
+        grouped = data.assign(date=data['timestamp'].dt.strftime('%d.%m.%Y'))
+        grouped = grouped.groupby(['date', 'category'], observed=True).agg({'total_active_time': 'sum'}).reset_index()
+        return grouped.sort_values('date')
+
+    def with_buckets():
+        grouped = data.assign(date=data['timestamp'].to_numpy().astype('datetime64[D]').astype('datetime64[s]'))
+        grouped = grouped.groupby(['date', 'category'], observed=True).agg({'total_active_time': 'sum'}).reset_index()
+        grouped = grouped.sort_values('date')
+        return grouped.assign(date=grouped['date'].dt.strftime('%d.%m.%Y'))
+
+    print(f"Date column ({rows} rows):")
+    timings = []
+    for function in (with_strings, with_buckets):
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+    print(f"- strftime {timings[0] * 1000:.1f} ms, buckets {timings[1] * 1000:.1f} ms ({timings[0] / timings[1]:.1f}x)")
+
+
+def benchmark_downsampling(sizes=(10_000, 100_000, 1_000_000)):
+    """Measures the drawing time (create_figure and render_figure) of a scatter plot of dense series (three hues), with
+    all points against the series downsampled by PlotManager.downsample_data (which is included in its time)."""
+    from data_analysis import PlotManager
+
+    plot_manager = PlotManager()
+    random = np.random.default_rng(0)
+    values = ['timestamp', 'total_active_time', 'category']
+    plot_settings = ('scatter', *values, "Benchmark", "Date", "Usage Time", "App Category", None, 'total', None)
+
+    def draw(data):
+        plot_manager.render_figure(plot_manager.create_figure(data, plot_settings))
+
+    print("Scatter plot drawing time (3 series):")
+    for rows in sizes:
+        start = np.datetime64('2024-01-01T00:00:00')
+        data = pd.DataFrame({'timestamp': start + np.sort(random.integers(0, 365 * 86400, rows)).astype('timedelta64[s]'),
+                             'total_active_time': random.integers(0, 3600, rows),
+                             'category': random.choice(['coding', 'gaming', 'browser'], rows)})
+        start_time = time.perf_counter()
+        draw(data)
+        full = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        downsampled = plot_manager.downsample_data(data, values)
+        draw(downsampled)
+        reduced = time.perf_counter() - start_time
+        print(f"- {rows} rows: all points {full * 1000:.0f} ms, downsampled to {len(downsampled)} points "
+              f"{reduced * 1000:.0f} ms ({full / reduced:.1f}x)")
+
+
+def benchmark_rendering(rows=200_000):
+    """Measures the drawing time (create_figure and render_figure) of the configured tracker plots with the seaborn and
+    the fast render mode. Like in the app, the drawn data is the output of prepare_data (in the render mode) for a
+    tracker history of rows, the preparation itself isn't measured."""
+    from data_analysis import PlotManager
+
+    plot_manager = PlotManager()
+    random = np.random.default_rng(0)
+    categories = [category for key_set in PRODUCTIVITY_PER_CATEGORY for category in key_set]
+    data = pd.DataFrame({'id': random.integers(1, 200, rows),
+                         'timestamp': pd.Timestamp.now() - pd.to_timedelta(random.integers(0, 365 * 86400, rows), 's'),
+                         'app_name': pd.Categorical(random.choice([f"app{i}.exe" for i in range(200)], rows)),
+                         'category': pd.Categorical(random.choice(categories, rows)),
+                         'activity': pd.Categorical(random.choice(ACTIVITY_LEVELS, rows)),
+                         'opened_time': random.integers(0, 3600, rows), 'active_time': random.integers(0, 3600, rows),
+                         'total_active_time': random.integers(0, 3600, rows)})
+
+    print(f"Drawing time (prepared from {rows} rows, Total):")
+    for analysis in DROPDOWN_CONTENT["Tracker"]:
+        plot_settings = plot_manager.get_dropdown_plot_settings(["Tracker", analysis, "Total", "Top", "Full"])
+        if plot_settings[0] == 'heatmap':
+            continue
+        plot_type, x, y, hue, plot_name, x_name, y_name, legend_name, sort, time_range, part = plot_settings
+        timings = {}
+        for render_mode in PLOT_RENDER_MODES:
+            plot_manager.render_mode = render_mode
+            prepared = plot_manager.prepare_data(data.copy(), plot_type, sort, time_range, part, [x, y, hue])
+            start_time = time.perf_counter()
+            plot_manager.render_figure(plot_manager.create_figure(prepared, plot_settings))
+            timings[render_mode] = time.perf_counter() - start_time
+        print(f"- {analysis} ({plot_type}): seaborn {timings['seaborn'] * 1000:.0f} ms, fast "
+              f"{timings['fast'] * 1000:.0f} ms ({timings['seaborn'] / timings['fast']:.1f}x)")
+
+
+BENCHMARKS = {"durability": benchmark_durability, "features": benchmark_features, "dates": benchmark_dates,
+              "parsing": benchmark_parsing, "downsampling": benchmark_downsampling, "rendering": benchmark_rendering}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
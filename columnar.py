@@ -0,0 +1,181 @@
+"""
+The columnar.py file contains the columnar on-disk format of the tracker history, which is much faster to load than the CSV files.
+Closed days (the daily tracker CSV files before today, and the monthly archives) are converted into one partition per month, with one NumPy .npy
+file per column, and a manifest.json describing them. Numeric columns are loaded memory-mapped (sharing the pages with
+the OS cache), string columns are dictionary-encoded (int32 codes and one dictionary per column, shared by all partitions).
+Partitions are rebuilt if one of their CSV files changed (e.g. by the retention policy), so the CSV files stay the source.
+
+Important Methods:
+- update_columnar(csv_file: str, columnar_root: str) -> int: Converts the closed days of a CSV stream into partitions, returns the number of rebuilt partitions.
+- load_columnar(columnar_root: str, start_time: datetime, csv_file: str) -> Tuple[DataFrame, Set[str]]: Loads the partitions from the start_time on, and returns the covered periods (days and months).
+
+Important Variables:
+- COLUMNAR_NUMERIC_COLUMNS: The numeric (int64) columns, the timestamp is stored as local naive datetime64[s].
+- COLUMNAR_STRING_COLUMNS: The dictionary-encoded string columns.
+"""
+
+import json
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from csv_util import get_csv_file_period, get_csv_files, TRACKER_FIELDNAMES
+
+COLUMNAR_NUMERIC_COLUMNS = ["id", "timestamp", "opened_time", "active_time", "total_active_time"]
+COLUMNAR_STRING_COLUMNS = ["app_name", "category", "activity"]
+MANIFEST_FILE = "manifest.json"
+
+
+def load_manifest(columnar_root):
+    """Loads the manifest of the columnar history, or returns an empty one if there is none (yet)."""
+    manifest_path = os.path.join(columnar_root, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {"version": 1, "dictionaries": {column: [] for column in COLUMNAR_STRING_COLUMNS}, "partitions": {}}
+    with open(manifest_path, mode='r') as file:
+        return json.load(file)
+
+
+def save_manifest(columnar_root, manifest):
+    """Saves the manifest atomically (temporary file and os.replace), so readers never see a partial one."""
+    manifest_path = os.path.join(columnar_root, MANIFEST_FILE)
+    with open(f"{manifest_path}.tmp", mode='w') as file:
+        json.dump(manifest, file)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def get_closed_days(csv_file):
+    """Returns {month: [(period, path, size, mtime), ...]} of all monthly archives and daily files of a CSV stream before
+    today (the period is the month or the day). The unrotated file (split into the daily files by split_legacy_csv) and
+    today's file (still being written) are left out."""
+    months = {}
+    for path in get_csv_files(csv_file):
+        period = get_csv_file_period(path)
+        if not period or len(period) == 10 and date.fromisoformat(period) >= date.today():
+            continue
+        stat = os.stat(path)
+        months.setdefault(period[:7], []).append((period, path, stat.st_size, stat.st_mtime_ns))
+    return months
+
+
+def update_columnar(csv_file, columnar_root):
+    """Converts the closed days of a CSV stream (e.g. data/tracker.csv) into monthly partitions in columnar_root.
+    Only months whose files changed since the last conversion (new days, appended or rewritten files) are rebuilt,
+    months whose files were all deleted are dropped. Files of replaced partitions are deleted, unless they are still
+    memory-mapped (then they are deleted at a later update).
+    :return: The number of rebuilt partitions."""
+    os.makedirs(columnar_root, exist_ok=True)
+    manifest = load_manifest(columnar_root)
+    months = get_closed_days(csv_file)
+    rebuilt = 0
+
+    for month, days in sorted(months.items()):
+        signature = [[period, size, mtime] for period, _, size, mtime in days]
+        partition = manifest["partitions"].get(month)
+        if partition and partition["signature"] == signature:
+            continue
+
+        data = pd.concat([pd.read_csv(path) for _, path, _, _ in days], ignore_index=True)
+        version = partition["version"] + 1 if partition else 1
+        manifest["partitions"][month] = _write_partition(columnar_root, month, version, data, manifest["dictionaries"])
+        manifest["partitions"][month]["signature"] = signature
+        rebuilt += 1
+
+    for month in [month for month in manifest["partitions"] if month not in months]:
+        del manifest["partitions"][month]
+
+    if rebuilt or len(manifest["partitions"]) != len(months):
+        save_manifest(columnar_root, manifest)
+    _delete_unused_files(columnar_root, manifest)
+    return rebuilt
+
+
+def _write_partition(columnar_root, month, version, data, dictionaries):
+    """Writes the columns of a month as .npy files (named after the month and version, so mapped files are never
+    overwritten), sorted by timestamp. The dictionaries are extended by new strings.
+    :return: The manifest entry of the partition."""
+    timestamps = pd.to_datetime(data['timestamp'], errors='coerce')
+    data = data.assign(timestamp=timestamps).dropna(subset=['timestamp']).sort_values('timestamp', kind='stable')
+
+    files = {}
+    for column in COLUMNAR_NUMERIC_COLUMNS:
+        if column == 'timestamp':
+            values = data['timestamp'].values.astype('datetime64[s]').astype(np.int64)
+        else:
+            values = pd.to_numeric(data[column], errors='coerce').fillna(0).to_numpy(np.int64)
+        files[column] = _save_column(columnar_root, month, version, column, values)
+
+    for column in COLUMNAR_STRING_COLUMNS:
+        dictionary = dictionaries[column]
+        lookup = {value: code for code, value in enumerate(dictionary)}
+        strings = data[column].fillna("").astype(str)
+        for value in strings.unique():
+            if value not in lookup:
+                lookup[value] = len(dictionary)
+                dictionary.append(value)
+        codes = strings.map(lookup).to_numpy(np.int32)
+        files[column] = _save_column(columnar_root, month, version, column, codes)
+
+    timestamps = data['timestamp'].values.astype('datetime64[s]').astype(np.int64)
+    return {"version": version, "rows": len(data), "files": files,
+            "start": int(timestamps[0]) if len(data) else None, "end": int(timestamps[-1]) if len(data) else None}
+
+
+def _save_column(columnar_root, month, version, column, values):
+    """Saves one column of a partition as .npy file and returns its file name."""
+    file_name = f"{month}.v{version}.{column}.npy"
+    np.save(os.path.join(columnar_root, file_name), values)
+    return file_name
+
+
+def _delete_unused_files(columnar_root, manifest):
+    """Deletes the .npy files which aren't referenced by the manifest (anymore), skipping files which are still in use."""
+    used = {file_name for partition in manifest["partitions"].values() for file_name in partition["files"].values()}
+    for file_name in os.listdir(columnar_root):
+        if file_name.endswith(".npy") and file_name not in used:
+            try:
+                os.remove(os.path.join(columnar_root, file_name))
+            except OSError:
+                pass  # Still memory-mapped (Windows), deleted at the next update
+
+
+def load_columnar(columnar_root, start_time=None, csv_file=None):
+    """Loads the partitions of the columnar history which contain data from the start_time on (datetime, None for all).
+    Numeric columns are memory-mapped, string columns become categoricals over the shared dictionaries (no string parsing).
+    If there is only one partition, the DataFrame is built on the memory-mapped arrays without copying them.
+    If the csv_file of the stream is given, partitions whose CSV files changed since their conversion are left out
+    (and their periods aren't covered), so the caller reads those periods from the CSV files instead of stale data.
+    :return: (DataFrame in the tracker.csv format or None, set of the covered periods (days and months) as isoformat strings)."""
+    manifest = load_manifest(columnar_root)
+    months = get_closed_days(csv_file) if csv_file else None
+    start = np.datetime64(start_time, 's').astype(np.int64) if start_time is not None else None
+    columns = {column: [] for column in COLUMNAR_NUMERIC_COLUMNS + COLUMNAR_STRING_COLUMNS}
+    covered_periods = set()
+
+    for month, partition in sorted(manifest["partitions"].items()):
+        if months is not None and partition["signature"] != [[period, size, mtime]
+                                                            for period, _, size, mtime in months.get(month, [])]:
+            continue
+        covered_periods.update(period for period, _, _ in partition["signature"])
+        if not partition["rows"] or (start is not None and partition["end"] < start):
+            continue
+
+        arrays = {column: np.load(os.path.join(columnar_root, file_name), mmap_mode='r')
+                  for column, file_name in partition["files"].items()}
+        first = int(np.searchsorted(arrays['timestamp'], start)) if start is not None else 0
+        for column, array in arrays.items():
+            columns[column].append(array[first:])
+
+    if not columns['timestamp']:
+        return None, covered_periods
+
+    def combine(arrays):
+        return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+    data = {column: combine(columns[column]) for column in COLUMNAR_NUMERIC_COLUMNS}
+    data['timestamp'] = data['timestamp'].view('datetime64[s]')
+    for column in COLUMNAR_STRING_COLUMNS:
+        data[column] = pd.Categorical.from_codes(combine(columns[column]),
+                                                 categories=manifest["dictionaries"][column])
+    return pd.DataFrame(data, columns=TRACKER_FIELDNAMES, copy=False), covered_periods
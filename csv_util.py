@@ -1,44 +1,624 @@
 """
-The csv_util.py file contains helpful functions for saving specific data into a CSV file.
-It is especially designed for notification and tracker data.
+The csv_util.py file contains helpful functions for writing and reading the tracker and notification CSV streams.
 
 Important Methods:
-- save_data_to_csv(csv_file: str, last_data: List[Tuple]) -> None: Configures and saves tracker data as a CSV file.
-- save_notification_to_csv(csv_file: str, notification: Dict) -> None: Configures and saves notification data as a CSV file.
+- read_csv_rows(csv_file: str) -> Iterator[Dict]: Yields the rows of a CSV file as dictionaries, one at a time.
+- apply_retention_to_csv(csv_file: str, tiers: Tuple) -> None: Downsamples (or deletes) old tracker data in place, following the retention tiers.
+- apply_retention_to_csv_files(csv_file: str, tiers: Tuple) -> None: Applies the retention tiers to the daily files of a CSV stream which need it.
+- get_rotated_csv_path(csv_file: str, day: date) -> str: Returns the path of the daily file of a CSV stream (e.g. tracker-2026-10-16.csv).
+- get_archive_csv_path(csv_file: str, month: str) -> str: Returns the path of the monthly archive of a CSV stream (e.g. tracker-2026-09.csv.gz).
+- get_csv_files(csv_file: str, start: datetime, end: datetime) -> List[str]: Returns the files (daily files and archives) of a CSV stream with data in the time range.
+- get_csv_file_period(path: str) -> str: Returns the day (daily file) or month (archive) of a CSV file, or None for an unrotated file.
+- open_csv(path: str, mode: str, compressed: bool) -> TextIO: Opens a CSV file, gzip archives are (de)compressed transparently.
+- read_csv_files(csv_file: str, start: datetime, end: datetime) -> Iterator[Dict]: Yields the rows of all files of a CSV stream in the time range.
+- split_legacy_csv(writer: CSVWriter, batch_size: int) -> int: Splits the unrotated file of a CSV stream (written before the daily rotation) into its daily files.
+- archive_csv_months(csv_file: str, compression_level: int) -> int: Compresses the daily files of closed months into monthly gzip archives.
+- get_time_index_path(csv_file: str) -> str: Returns the path of the time index sidecar of a CSV file (e.g. tracker-2026-10-16.csv.idx).
+- read_time_index(csv_file: str) -> List[Tuple[int, int]]: Reads the valid (hour bucket, byte offset) entries of the time index of a CSV file.
+- build_time_index(csv_file: str) -> List[Tuple[int, int]]: Builds (and saves) the time index of a CSV file by scanning it once.
+- get_time_index_offset(csv_file: str, start: datetime) -> int: Returns the byte offset from which on all rows from the start on are, using the time index.
+- read_typed_csv(source, **kwargs) -> DataFrame: Reads a CSV file (or buffer) with the dtypes of CSV_SCHEMA.
+- apply_csv_schema(data: DataFrame) -> DataFrame: Parses the timestamps (explicit format) and downcasts the time columns of a parsed CSV part.
+- concat_frames(frames: List[DataFrame]) -> DataFrame: Concatenates DataFrames, unifying the categories so categorical columns stay categorical.
+
+Important Classes:
+- CSVWriter: Long-lived, buffered writer of a CSV stream, which rotates to one file per day.
+- CSVTailLoader: Keeps parsed CSV files resident and only parses the bytes appended since the last load.
+
+Important Variables:
+- TRACKER_FIELDNAMES: The columns of tracker.csv.
+- NOTIFICATION_FIELDNAMES: The columns of notifications.csv.
+- CSV_SCHEMA: The dtypes the CSV columns are parsed into for analysis (categoricals for the repeated strings, int32 for the times).
+- CSV_READ_DTYPES: The dtypes given to pd.read_csv directly (the categoricals of CSV_SCHEMA), the rest is converted by apply_csv_schema.
+- CSV_TIMESTAMP_FORMAT: The format of the timestamps in the CSV files (isoformat, see util.to_isoformat).
 """
 
+import bisect
 import csv
+import glob
+import gzip
+import io
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from settings import CSV_ARCHIVE_COMPRESSION_LEVEL, CSV_BATCH_SIZE, CSV_FLUSH_RATE, CSV_FLUSH_SIZE
+from util import get_bucket, get_retention_resolution, to_epoch, to_isoformat
+
+TRACKER_FIELDNAMES = ["id", "timestamp", "app_name", "category", "activity", "opened_time", "active_time",
+                      "total_active_time"]
+NOTIFICATION_FIELDNAMES = TRACKER_FIELDNAMES + ["notification_text", "notification_type", "like"]
+CSV_SCHEMA = {"id": np.int32, "app_name": "category", "category": "category", "activity": "category",
+              "opened_time": np.int32, "active_time": np.int32, "total_active_time": np.int32,
+              "notification_type": "category"}
+# Only the categoricals are given to pd.read_csv, the integer columns may contain floats or empty values (apply_csv_schema)
+CSV_READ_DTYPES = {column: dtype for column, dtype in CSV_SCHEMA.items() if dtype == 'category'}
+CSV_TIMESTAMP_FORMAT = "ISO8601"
+
+
+class CSVWriter:
+    """
+    Long-lived writer of a CSV stream (e.g. tracker.csv), which keeps its file open and buffers the rows in memory.
+    The rows are written on flush(), which should be called once needs_flush is True (size or time threshold).
+    Every day has its own file (tracker.csv -> tracker-2026-10-16.csv, by the rows timestamp), so time ranges
+    only have to read the files of their days. Every file has a time index sidecar (see read_time_index), which is
+    updated on each append, so short time ranges can seek to their first row. Thread-safe, so it can be flushed by the
+    SQL writer thread.
+
+    Attributes:
+        csv_file (str): The base path of the stream, the daily files are named after it.
+        fieldnames (list): The columns of the CSV files.
+        flush_size (int): Number of buffered rows after which needs_flush is True.
+        flush_rate (int): Seconds after the last flush after which needs_flush is True (if there are buffered rows).
+        buffer (list): The buffered rows (dictionaries, timestamps in epoch seconds or isoformat).
+        last_flush (float): The time of the last flush.
+        file: The open file of the current day (or None).
+        writer (csv.DictWriter): The writer of the open file (or None).
+        index_file: The open time index sidecar of the open file (or None).
+        max_bucket (int): The highest hour bucket written to the open file (the last index entry), or None.
+        day (date): The day of the open file.
+        lock (threading.Lock): Guards the buffer and the file.
+
+    Methods:
+        write_rows(rows): Buffers rows, they are written at the next flush.
+        needs_flush: Whether the size or time threshold is reached.
+        flush(): Writes the buffered rows into their daily files.
+        close(): Flushes the buffer and closes the file, can be called multiple times.
+    """
+    def __init__(self, csv_file, fieldnames, flush_size=CSV_FLUSH_SIZE, flush_rate=CSV_FLUSH_RATE):
+        self.csv_file = csv_file
+        self.fieldnames = fieldnames
+        self.flush_size = flush_size
+        self.flush_rate = flush_rate
+        self.buffer = []
+        self.last_flush = time.time()
+        self.file = None
+        self.writer = None
+        self.day = None
+        self.index_file = None
+        self.max_bucket = None
+        self.lock = threading.Lock()
+
+    def write_rows(self, rows):
+        """Buffers the rows (dictionaries), they are written at the next flush."""
+        with self.lock:
+            self.buffer.extend(rows)
+
+    @property
+    def needs_flush(self):
+        """Whether the buffer reached flush_size, or flush_rate has passed since the last flush (with buffered rows)."""
+        return len(self.buffer) >= self.flush_size or (
+                self.buffer and time.time() - self.last_flush >= self.flush_rate)
+
+    def flush(self):
+        """Writes the buffered rows into the files of their days (the timestamps are written in isoformat),
+        and flushes the file, so readers see them. Rotates the open file if a row belongs to another day.
+        If a row is the first one of a higher hour bucket, its offset is added to the time index first (and flushed,
+        so the index never misses a bucket which is already in the file)."""
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+            self.last_flush = time.time()
+            for row in rows:
+                timestamp = to_epoch(row['timestamp'])
+                day = datetime.fromtimestamp(timestamp).date()
+                if day != self.day:
+                    self._open(day)
+                bucket = get_bucket(timestamp, 'hour')
+                if self.max_bucket is None or bucket > self.max_bucket:
+                    self.index_file.write(f"{bucket},{self.file.tell()}\n")
+                    self.index_file.flush()
+                    self.max_bucket = bucket
+                self.writer.writerow({**row, 'timestamp': to_isoformat(timestamp)})
+            if self.file:
+                self.file.flush()
+
+    def _open(self, day):
+        """Closes the open file and opens (appends to) the file of the day, writing the header if it is new.
+        Its time index is loaded (and rewritten without invalid entries), or built if the file has none yet."""
+        self._close_file()
+        path = get_rotated_csv_path(self.csv_file, day)
+        entries = read_time_index(path) if os.path.exists(get_time_index_path(path)) else build_time_index(path)
+        with open(get_time_index_path(path), mode='w') as index_file:
+            index_file.writelines(f"{bucket},{offset}\n" for bucket, offset in entries)
+        self.max_bucket = entries[-1][0] if entries else None
+
+        self.file = open(path, mode='a', newline='')
+        self.index_file = open(get_time_index_path(path), mode='a')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames, extrasaction='ignore')
+        self.day = day
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def _close_file(self):
+        """Closes the open file and its time index."""
+        if self.file:
+            self.file.close()
+            self.index_file.close()
+        self.file, self.index_file, self.writer, self.day = None, None, None, None
+
+    def close(self):
+        """Flushes the buffer and closes the file, does nothing if there is nothing left."""
+        self.flush()
+        with self.lock:
+            self._close_file()
+
+
+class CSVTailLoader:
+    """
+    Keeps the parsed rows of CSV files resident (as DataFrames), together with the byte offset consumed so far. The files
+    are append-only, so loading a file again only parses the bytes appended since the last load and concatenates them.
+    A file is parsed again from the start if it was replaced (another inode, e.g. rewritten by the retention policy or
+    archived and written again), truncated (it is shorter than the offset, or the bytes before the offset changed) or has
+    another header. gzip archives can't be tailed, they are parsed again whenever their size or mtime changed.
+    The rows are parsed with the CSV_SCHEMA dtypes (read_typed_csv).
+    Not thread-safe, it is meant for a single reader (the plot worker thread).
+
+    Attributes:
+        files (dict): The resident files, path -> {"identity", "signature", "header", "start", "offset", "tail", "data"},
+                      the rows from the start offset up to the offset are parsed.
+
+    Methods:
+        load(path, start): Returns the complete rows of a file (from the start on) as DataFrame (None if it has none), parsing only the appended bytes.
+        retain(paths): Drops the resident files which aren't in paths (deleted, or read from elsewhere now).
+    """
+    TAIL_SIZE = 256  # Bytes before the offset which are compared to detect rewrites
+
+    def __init__(self):
+        self.files = {}
+
+    def load(self, path, start=None):
+        """Returns all complete rows of the file as DataFrame, or None if it has none (or doesn't exist). An incomplete
+        last line (a row being written) is left for the next load. If the file is resident and was only appended to,
+        only the appended bytes are parsed.
+        With a start (datetime), the rows before the offset of the start in the time index (get_time_index_offset) may be
+        left out, so a file loaded first for a short time range is only parsed from there. If a later load has an
+        earlier start, only the rows between the two offsets are parsed (and prepended)."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.files.pop(path, None)
+            return None
+        identity = (stat.st_dev, stat.st_ino)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        state = self.files.get(path)
+        wanted = get_time_index_offset(path, start) if start is not None else None
+        if state is not None and state["identity"] == identity and state["signature"] == signature and (
+                state["start"] is None or state["start"] <= max(wanted or 0, len(state["header"]))):
+            return state["data"]
+
+        if path.endswith(".gz"):
+            data = read_typed_csv(path)
+            self.files[path] = {"identity": identity, "signature": signature, "header": None, "start": None,
+                                "offset": None, "tail": None, "data": data if len(data) else None}
+            return self.files[path]["data"]
+
+        with open(path, mode='rb') as file:
+            header = file.readline()
+            if not header.endswith(b"\n"):
+                self.files.pop(path, None)
+                return None  # The header isn't written completely yet
+            if state is not None and not self._is_appended(file, state, identity, header, stat.st_size):
+                state = None
+            begin = max(wanted or 0, len(header))
+            if state is None:
+                state = {"header": header, "start": begin, "offset": begin, "tail": b"", "data": None}
+            elif begin < state["start"]:
+                file.seek(begin)
+                part = self._parse(header, file.read(state["start"] - begin))
+                state["data"] = part if state["data"] is None else concat_frames([part, state["data"]])
+                state["start"] = begin
+            file.seek(state["offset"])
+            appended = file.read()
+
+        complete = appended[:appended.rfind(b"\n") + 1]
+        if complete:
+            part = self._parse(header, complete)
+            state["data"] = part if state["data"] is None else concat_frames([state["data"], part])
+            state["offset"] += len(complete)
+            state["tail"] = (state["tail"] + complete)[-self.TAIL_SIZE:]
+        state["identity"] = identity
+        state["signature"] = (state["offset"], stat.st_mtime_ns) if len(complete) < len(appended) else signature
+        self.files[path] = state
+        return state["data"]
+
+    def retain(self, paths):
+        """Drops the resident files which aren't in paths, so their rows don't stay in memory."""
+        paths = set(paths)
+        for path in [path for path in self.files if path not in paths]:
+            del self.files[path]
+
+    @staticmethod
+    def _parse(header, lines):
+        """Parses complete CSV lines (bytes, without header) with the columns of the header line."""
+        columns = next(csv.reader([header.decode()]))
+        return read_typed_csv(io.BytesIO(lines), header=None, names=columns)
+
+    def _is_appended(self, file, state, identity, header, size):
+        """Returns whether the open file is still the resident one with rows appended (same inode and header, not shorter
+        than the offset and the bytes before the offset unchanged), else it has to be parsed from the start."""
+        if state["identity"] != identity or state["header"] != header or size < state["offset"]:
+            return False
+        file.seek(state["offset"] - len(state["tail"]))
+        return file.read(len(state["tail"])) == state["tail"]
+
+
+def get_rotated_csv_path(csv_file, day):
+    """Returns the path of the daily file of a CSV stream, e.g. data/tracker.csv -> data/tracker-2026-10-16.csv."""
+    root, extension = os.path.splitext(csv_file)
+    return f"{root}-{day.isoformat()}{extension}"
+
+
+def get_archive_csv_path(csv_file, month):
+    """Returns the path of the monthly archive of a CSV stream, e.g. data/tracker.csv -> data/tracker-2026-09.csv.gz."""
+    root, extension = os.path.splitext(csv_file)
+    return f"{root}-{month}{extension}.gz"
+
+
+def get_csv_period_range(period):
+    """Returns the first and the last day of a period (a day or a month in isoformat)."""
+    if len(period) == 10:
+        day = date.fromisoformat(period)
+        return day, day
+    first = date.fromisoformat(f"{period}-01")
+    return first, (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def get_csv_files(csv_file, start=None, end=None):
+    """Returns the existing files of a CSV stream with data in the time range (datetimes, None is unbounded), sorted by
+    their first day: the monthly archives and the daily files. The unrotated csv_file (written before the daily
+    rotation) is always included first, it may contain any day."""
+    root, extension = os.path.splitext(csv_file)
+    pattern = re.compile(
+        rf"{re.escape(os.path.basename(root))}-(\d{{4}}-\d{{2}}(?:-\d{{2}})?){re.escape(extension)}(\.gz)?$")
+    files = []
+    for path in glob.glob(f"{glob.escape(root)}-*{extension}*"):
+        match = pattern.search(path)
+        if not match or len(match.group(1)) == 10 and match.group(2):
+            continue
+        first_day, last_day = get_csv_period_range(match.group(1))
+        if (start is None or last_day >= start.date()) and (end is None or first_day <= end.date()):
+            files.append((first_day, len(match.group(1)), path))
 
-from util import convert_last_data_to_dict
+    legacy = [csv_file] if os.path.exists(csv_file) else []
+    return legacy + [path for _, _, path in sorted(files)]
 
 
-def save_data_to_csv(csv_file, last_data):
-    """Configures and Saves Tracker Data as CSV file."""
-    if not last_data:
+def get_csv_file_period(path):
+    """Returns the period of a CSV file as isoformat string: the day of a daily file (tracker-2026-10-16.csv -> 2026-10-16),
+    the month of an archive (tracker-2026-09.csv.gz -> 2026-09), None if it is neither."""
+    match = re.search(r"-(\d{4}-\d{2}-\d{2})\.[^.\\/]+$", path) or re.search(r"-(\d{4}-\d{2})\.[^.\\/]+\.gz$", path)
+    return match.group(1) if match else None
+
+
+def open_csv(path, mode='r', compressed=None):
+    """Opens a CSV file in text mode (newline=''), gzip archives (.gz, or if compressed is True) are (de)compressed transparently."""
+    if compressed is None:
+        compressed = path.endswith(".gz")
+    if compressed:
+        return gzip.open(path, f"{mode}t", newline='')
+    return open(path, mode=mode, newline='')
+
+
+def read_csv_files(csv_file, start=None, end=None):
+    """Yields the rows of all files of a CSV stream with data in the time range, one at a time (see get_csv_files)."""
+    for path in get_csv_files(csv_file, start, end):
+        yield from read_csv_rows(path)
+
+
+def archive_csv_months(csv_file, compression_level=CSV_ARCHIVE_COMPRESSION_LEVEL):
+    """Compresses the daily files of every closed month (ended before yesterday, so no late rows are written anymore)
+    into one gzip archive per month (see get_archive_csv_path), then deletes them. Daily files of an already archived
+    month are appended to its archive (as new gzip member). The archive is written to a temporary file first.
+    :return: The number of archived daily files."""
+    yesterday = date.today() - timedelta(days=1)
+    months = {}
+    for path in get_csv_files(csv_file):
+        period = get_csv_file_period(path)
+        if period and len(period) == 10 and get_csv_period_range(period[:7])[1] < yesterday:
+            months.setdefault(period[:7], []).append(path)
+
+    for month, paths in sorted(months.items()):
+        archive = get_archive_csv_path(csv_file, month)
+        exists = os.path.exists(archive)
+        with open(f"{archive}.tmp", mode='wb') as file:
+            if exists:
+                with open(archive, mode='rb') as old_archive:
+                    shutil.copyfileobj(old_archive, file)  # The compressed bytes, they aren't decompressed
+            with gzip.open(file, mode='wt', compresslevel=compression_level, newline='') as compressed:
+                for index, path in enumerate(paths):
+                    with open(path, mode='r', newline='') as daily_file:
+                        header = daily_file.readline()
+                        if index == 0 and not exists:
+                            compressed.write(header)
+                        shutil.copyfileobj(daily_file, compressed)
+        os.replace(f"{archive}.tmp", archive)
+        for path in paths:
+            os.remove(path)
+            if os.path.exists(get_time_index_path(path)):
+                os.remove(get_time_index_path(path))
+    return sum(len(paths) for paths in months.values())
+
+
+def read_csv_rows(csv_file):
+    """Yields the rows of a CSV file as dictionaries, one at a time (nothing if the file doesn't exist)."""
+    if not os.path.exists(csv_file):
         return
 
-    with open(csv_file, mode='a', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=["id", "timestamp", "app_name", "category", "activity", "opened_time",
-                                                  "active_time", "total_active_time"])
+    with open_csv(csv_file, mode='r') as file:
+        for row in csv.DictReader(file):
+            yield row
 
-        if file.tell() == 0:
-            writer.writeheader()
 
-        for data in last_data:
-            writer.writerow(convert_last_data_to_dict(data))
+def split_legacy_csv(writer, batch_size=CSV_BATCH_SIZE):
+    """Splits the unrotated file of the writers stream (e.g. tracker.csv, written before the daily rotation) into the
+    daily files, so it gets time indices and its closed days are converted into the columnar history.
+    The file is renamed first (get_csv_files doesn't list it anymore), then its rows are written by the writer (so rows
+    of a day which is written live don't interleave) in batches of batch_size rows. The number of split rows is stored
+    in a progress sidecar after every batch, so an interrupted split continues where it stopped (a batch written right
+    before the interruption is written again). Rows with an invalid timestamp are dropped. At the end the renamed file,
+    its time index and the progress sidecar are deleted.
+    :return: The number of rows written (by this call)."""
+    split_file, progress_file = f"{writer.csv_file}.split", f"{writer.csv_file}.split.progress"
+    if os.path.exists(writer.csv_file) and not os.path.exists(split_file):
+        os.replace(writer.csv_file, split_file)
+    if not os.path.exists(split_file):
+        return 0
 
+    done = 0
+    if os.path.exists(progress_file):
+        with open(progress_file, mode='r') as file:
+            done = int(file.read() or 0)
 
-def save_notification_to_csv(csv_file, notification):
-    """Configures and Saves Notification Data as CSV file."""
-    if not notification:
+    count, written = 0, 0
+    batch = []
+    for row in read_csv_rows(split_file):
+        count += 1
+        if count <= done:
+            continue
+        try:
+            to_epoch(row['timestamp'])
+        except (KeyError, ValueError, TypeError):
+            continue  # Broken row (e.g., from an interrupted write)
+        batch.append(row)
+        written += 1
+        if len(batch) >= batch_size:
+            writer.write_rows(batch)
+            writer.flush()
+            batch = []
+            with open(progress_file, mode='w') as file:
+                file.write(str(count))
+    writer.write_rows(batch)
+    writer.flush()
+
+    for path in (split_file, get_time_index_path(writer.csv_file), progress_file):
+        if os.path.exists(path):
+            os.remove(path)
+    return written
+
+
+def apply_retention_to_csv(csv_file, tiers):
+    """Downsamples the tracker data in place, following the retention tiers (like RETENTION_TIERS).
+    Rows in an 'hour' or 'day' tier are summed per bucket, app and category, rows older than all tiers are deleted.
+    The downsampled rows are written first (they are the oldest), then the full resolution rows, into a temporary
+    file which replaces the old one. Only the aggregates are kept in memory, the rows are streamed twice.
+    Rows which can't be parsed (e.g. a line truncated by a crash) are skipped, so they are dropped if the file is
+    rewritten. If no row is left, the file is deleted."""
+    now = time.time()
+    aggregated = {}
+    changed = False
+    full_rows = 0
+    for row in read_csv_rows(csv_file):
+        try:
+            resolution = get_retention_resolution(row['timestamp'], tiers, now)
+            if resolution == 'full':
+                full_rows += 1
+                continue
+            if resolution is None:
+                changed = True  # Deleted
+                continue
+
+            bucket = get_bucket(row['timestamp'], resolution)
+            times = {column: int(float(row[column] or 0)) for column in ("opened_time", "active_time", "total_active_time")}
+        except (KeyError, ValueError, TypeError):
+            continue  # Broken row (e.g., from an interrupted write)
+
+        key = (bucket, row['app_name'], row['category'])
+        if key in aggregated:
+            changed = True  # Merged
+            for column, value in times.items():
+                aggregated[key][column] += value
+        else:
+            changed = changed or to_epoch(row['timestamp']) != bucket
+            aggregated[key] = {**row, 'timestamp': datetime.fromtimestamp(bucket).isoformat(), **times}
+
+    if not changed:
+        return
+    if os.path.exists(get_time_index_path(csv_file)):
+        os.remove(get_time_index_path(csv_file))  # The offsets change, it's built again if the file is appended to
+    if not aggregated and not full_rows:
+        os.remove(csv_file)  # Everything is older than the retention tiers
         return
 
-    with open(csv_file, mode='a', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=["id", "timestamp", "app_name", "category", "activity", "opened_time",
-                                                  "active_time", "total_active_time", "timestamp", "notification_text",
-                                                  "notification_type", "like"])
+    temp_file = f"{csv_file}.tmp"
+    with open_csv(temp_file, mode='w', compressed=csv_file.endswith(".gz")) as file:
+        writer = csv.DictWriter(file, fieldnames=TRACKER_FIELDNAMES, extrasaction='ignore')
+        writer.writeheader()
+        for key in sorted(aggregated):
+            writer.writerow(aggregated[key])
+        for row in read_csv_rows(csv_file):
+            try:
+                if get_retention_resolution(row['timestamp'], tiers, now) == 'full':
+                    writer.writerow(row)
+            except (KeyError, ValueError, TypeError):
+                continue
+    os.replace(temp_file, csv_file)  # Replacing the file reclaims the space
+
+
+def apply_retention_to_csv_files(csv_file, tiers):
+    """Applies the retention tiers to all files of a CSV stream (see apply_retention_to_csv), each file (or archive) on its own.
+    Only files whose period spans several tiers, or which entered their tier since they were last written, are read:
+    files whose whole period is older than all tiers are deleted unread, files which are still at full resolution or were
+    already rewritten after their newest day entered their tier are skipped (so most files aren't decompressed at all).
+    The unrotated csv_file (without period) is always processed."""
+    now = time.time()
+    for path in get_csv_files(csv_file):
+        period = get_csv_file_period(path)
+        if period:
+            first, last = get_csv_period_range(period)
+            start = datetime.combine(first, datetime.min.time()).timestamp()
+            end = datetime.combine(last + timedelta(days=1), datetime.min.time()).timestamp()
+            resolution = get_retention_resolution(start, tiers, now)
+            if resolution == get_retention_resolution(end - 1, tiers, now):
+                if resolution is None:
+                    os.remove(path)
+                    if os.path.exists(get_time_index_path(path)):
+                        os.remove(get_time_index_path(path))
+                    continue
+
+                # Age (in days) at which the rows enter the tier of the resolution, the max age of the tier before it
+                entry_age = 0
+                for max_age, tier_resolution in tiers:
+                    if tier_resolution == resolution:
+                        break
+                    entry_age = max_age
+                if resolution == 'full' or os.path.getmtime(path) >= end + entry_age * 86400:
+                    continue
+        apply_retention_to_csv(path, tiers)
+
+
+def get_time_index_path(csv_file):
+    """Returns the path of the time index sidecar of a CSV file, e.g. tracker-2026-10-16.csv -> tracker-2026-10-16.csv.idx."""
+    return f"{csv_file}.idx"
+
+
+def read_time_index(csv_file):
+    """Reads the time index of a CSV file: lines of "hour bucket,byte offset", one for every row which was the first one
+    with a higher hour bucket than all rows before it (the rows don't have to be sorted). So all rows of a bucket (and later)
+    are at or after the offset of the first entry with a bucket >= it.
+    Entries beyond the end of the file (from a crash before the rows were written) are left out.
+    :return: List of (bucket, offset), empty if there is no (valid) index."""
+    index_path = get_time_index_path(csv_file)
+    if not os.path.exists(index_path) or not os.path.exists(csv_file):
+        return []
+
+    size = os.path.getsize(csv_file)
+    entries = []
+    with open(index_path, mode='r') as file:
+        for line in file:
+            try:
+                bucket, offset = map(int, line.split(","))
+            except ValueError:
+                break  # Incomplete last line
+            if offset > size or (entries and bucket <= entries[-1][0]):
+                break
+            entries.append((bucket, offset))
+    return entries
+
+
+def build_time_index(csv_file):
+    """Builds the time index of an existing CSV file (without one) by scanning its lines once, and saves it.
+    :return: List of (bucket, offset), see read_time_index."""
+    entries = []
+    if not os.path.exists(csv_file):
+        return entries
+
+    with open(csv_file, mode='rb') as file:
+        header = next(csv.reader([file.readline().decode()]), [])
+        timestamp_index = header.index('timestamp') if 'timestamp' in header else None
+        offset = file.tell()
+        for line in iter(file.readline, b""):
+            if timestamp_index is None or not line.endswith(b"\n"):
+                break
+            try:
+                bucket = get_bucket(next(csv.reader([line.decode()]))[timestamp_index], 'hour')
+            except (IndexError, ValueError):
+                bucket = None
+            if bucket is not None and (not entries or bucket > entries[-1][0]):
+                entries.append((bucket, offset))
+            offset += len(line)
+
+    with open(get_time_index_path(csv_file), mode='w') as file:
+        file.writelines(f"{bucket},{offset}\n" for bucket, offset in entries)
+    return entries
+
+
+def get_time_index_offset(csv_file, start):
+    """Returns the byte offset of a CSV file from which on all rows with a timestamp from the start (datetime) on are,
+    using its time index, or None if it has no index (or isn't a plain CSV file), then the whole file has to be read."""
+    if csv_file.endswith(".gz"):
+        return None
+    entries = read_time_index(csv_file)
+    if not entries:
+        return None
+
+    position = bisect.bisect_left(entries, (get_bucket(int(start.timestamp()), 'hour'), -1))
+    return entries[position][1] if position < len(entries) else os.path.getsize(csv_file)
+
+
+def read_typed_csv(source, **kwargs):
+    """Reads a CSV file (path or buffer, the kwargs are passed to pd.read_csv) for analysis: the repeated strings are
+    parsed directly into categoricals, the timestamps and times by apply_csv_schema."""
+    return apply_csv_schema(pd.read_csv(source, dtype=CSV_READ_DTYPES, **kwargs))
+
+
+def apply_csv_schema(data):
+    """Converts a parsed CSV part to the CSV_SCHEMA: the timestamps are parsed with CSV_TIMESTAMP_FORMAT (invalid ones
+    become NaT, so they never pass a time filter), the integer columns are downcast (float values are truncated, missing
+    or invalid values like the empty id of an unflushed row become 0).
+    Columns which are already parsed (e.g. dtype given to pd.read_csv) are left as they are."""
+    if 'timestamp' in data.columns and not pd.api.types.is_datetime64_any_dtype(data['timestamp']):
+        data['timestamp'] = pd.to_datetime(data['timestamp'], format=CSV_TIMESTAMP_FORMAT, errors='coerce')
+    for column, dtype in CSV_SCHEMA.items():
+        if column in data.columns and data[column].dtype != dtype:
+            if dtype == 'category':
+                data[column] = data[column].astype('category')
+            else:
+                data[column] = pd.to_numeric(data[column], errors='coerce').fillna(0).astype(dtype)
+    return data
+
 
-        if file.tell() == 0:
-            writer.writeheader()
+def concat_frames(frames):
+    """Concatenates DataFrames (like pd.concat with ignore_index). If a column is categorical in any of them, the categories
+    are unified first (in order of appearance), pd.concat would fall back to Python strings if they differ.
+    :return: The concatenated DataFrame (a new one, even for a single frame), None if there are no frames."""
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return None
 
-        writer.writerow(notification)
+    for column in frames[0].columns:
+        if not any(column in frame.columns and isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+            continue
+        columns = [frame[column].astype('category') if column in frame.columns else None for frame in frames]
+        categories = pd.Index([])
+        for values in columns:
+            if values is not None:
+                categories = categories.append(values.cat.categories.difference(categories, sort=False))
+        frames = [frame.assign(**{column: values.cat.set_categories(categories)}) if values is not None else frame
+                  for frame, values in zip(frames, columns)]
+    return pd.concat(frames, ignore_index=True)
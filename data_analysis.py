@@ -1,12 +1,27 @@
+import io
+import queue
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
+from matplotlib import cbook, mlab
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+from category import get_app_category
+from columnar import load_columnar, MANIFEST_FILE
+from csv_util import (apply_csv_schema, concat_frames, CSVTailLoader, get_csv_file_period, get_csv_files,
+                      NOTIFICATION_FIELDNAMES, TRACKER_FIELDNAMES)
 from menu_settings import DROPDOWN_CONTENT
 from plot_settings import *
-from settings import NOTIFICATION_CSV_PATH, os, TRACKER_CSV_PATH
-from util import format_time, get_productivity_by_category, map_activity, one_hot_encode, convert_last_data_to_dataframe
+from settings import (ACTIVITY_LEVELS, COLUMNAR_ROOT, NOTIFICATION_HISTORY_TABLE_COLUMNS, os, ROLLUP_TABLE_COLUMNS,
+                      SESSIONS_TABLE_COLUMNS, TRACKER_CSV_PATH)
+from util import (format_time, get_productivity_by_categories, largest_triangle_three_buckets, map_activities,
+                  one_hot_encode, convert_last_data_to_dataframe)
 
 
 class PlotManager:
@@ -14,34 +29,73 @@ class PlotManager:
     The PlotManager class is responsible for managing and creating plots based on the data analysis.
 
     Attributes:
-        tracker (object): The manager object that provides necessary functionality for the PlotManager.
+        tracker (object): The manager object that provides necessary functionality for the PlotManager (None if headless).
+        base_path (str): Directory the data paths are relative to, None for the directory of the app (autostart_manager).
+        loader (SQLLoader): The SQLLoader of the SQL data, None for the one of the app.
         dark_palette (list): A list of dark color codes for plotting.
+        job (int): Number of the latest requested plot, jobs with a lower number are cancelled.
+        pending (tuple): The requested job which isn't rendered yet, (job, dropdown_values, last_data, session) or None.
+        results (queue.Queue): The rendered plots (job, image, plot_type) of the worker, the Tk thread takes them (poll_results).
+        shown (int): Number of the latest job whose result was taken by the Tk thread.
+        polling (bool): Whether poll_results is scheduled on the Tk thread.
+        condition (threading.Condition): Guards job and pending, and wakes up the worker.
+        worker (threading.Thread): The plot worker thread (render_plots), started at the first plot.
+        cache (PlotCache): LRU cache of the prepared data and rendered plots, keyed by the data version and plot settings.
+        tracker_tail (CSVTailLoader): The resident tracker CSV files (which the columnar history doesn't cover), only appended rows are parsed.
+        render_mode (str): 'fast' draws the plots with plain Matplotlib where possible, 'seaborn' always with seaborn (PLOT_RENDER_MODE).
 
     Methods:
         __init__(self, manager): Initializes the PlotManager instance with the provided manager object.
-        load_tracker_data(self): Loads and prepares the raw data from tracker.csv.
-        load_notification_data(self): Loads and prepares the raw data from notifications.csv.
+        create_plot(self, dropdown_values, root): Schedules a plot of the dropdown values in the plot worker thread, cancelling the current one.
+        render_plots(self): The loop of the plot worker thread, collapses bursts of jobs into the latest one.
+        poll_results(self, root): Shows the rendered plots of the worker (on the Tk thread), polls again until the latest job is done.
+        render_plot(self, job, dropdown_values, last_data, session): Loads and prepares the data and renders the plot as PNG, stops if the job is cancelled.
+        get_dropdown_plot_settings(dropdown_values): Returns the plot settings of the dropdown values (Tracker uses the App Usage plots).
+        load_plot_data(self, dropdown_values, plot_settings, last_data, job, session): Loads the data of the plot from its source and prepares it.
+        is_cancelled(self, job): Returns whether a newer plot was requested since the job.
+        get_cache_key(self, source, plot_settings, last_data, session): Returns the cache key of a plot, (source, data version, time range start, plot settings).
+        get_data_version(self, source, time_range, last_data, session): Returns the version of the data source, it changes whenever its data changes.
+        get_file_version(path): Returns the version (size and mtime) of a file.
+        get_abs_path(self, path): Returns the absolute path of a data path (like TRACKER_CSV_PATH).
+        get_loader(self): Returns the SQLLoader of the SQL data.
+        show_plot(self, job, image, plot_type): Shows the rendered plot in tkinter (on the Tk thread), unless the job is cancelled.
+        load_tracker_data(self, start_time): Loads and prepares the raw data of the time range, from the columnar history and the remaining (resident) tracker CSV files.
+        load_resident_csv_files(self, csv_path, start_time, skip_periods): Loads the files of a CSV stream from the tracker_tail, only parsing the rows appended since the last load.
+        load_rollup_data(self, start_time, values): Loads the pre-aggregated daily rows of the time range from the SQL rollups, in the format of tracker.csv.
+        load_session_data(self, start_time, session): Loads the sessions of the time range from the SQL session log (and the running session), in the format of tracker.csv.
+        load_notification_data(self, start_time): Loads the raw data of the time range from the SQL notification history.
         prepare_data(self, data, plot_type, sort, time_range, part, values): Performs all data preparation steps.
         sort_data_by(self, data, sort): Sorts data based on the selected sort criteria.
+        downsample_data(data, values): Downsamples each series (hue) of dense line and scatter plots with LTTB.
         filter_by_part(self, data, part): Filters data based on user selection.
+        get_time_range_start(self, time_range): Returns the start of the time range (None for total).
         filter_by_time_range(self, data, time_range): Filters data based on the selected time range.
-        create_date_column(self, data, time_range): Creates the date column based on the time range.
+        create_date_column(self, data, time_range): Creates the date column (time buckets) based on the time range.
+        format_date_column(self, data, time_range): Formats the date buckets of the final rows as labels.
         add_productivity(self, data): Adds productivity score.
         calculate_message_count(self, data): Calculates the message count.
+        order_categories(data): Orders the categories of the categorical columns by appearance, dropping the unused ones.
         encode_data(self, data): Encodes values using the one_hot_encode, specifically targeting: activity, category, and notification_type columns from data.
-        create_tkinter_plot(self, data, plot_settings, root): Creates the Matplotlib plot and shows the canvas in tkinter via self.tracker.app.tk_manager.show_plot(plot).
-        close_plot(self, plot): Closes the plot.
+        create_figure(self, data, plot_settings): Creates the Matplotlib figure (without pyplot, so it is thread-safe).
+        draw_fast_plot(self, ax, data, plot_type, x, y, hue): Draws the plot with plain Matplotlib (fast render mode), skipping seaborn's confidence intervals.
+        get_axis_positions(values, categorical): Returns the positions of the values on a plot axis and the tick labels, like seaborn.
+        render_figure(fig, image_format): Renders the figure with Agg as PNG (or e.g. SVG) bytes.
         get_plot_settings(self, values): Determines the plot settings based on the dropdown selections.
     """
 
-    def __init__(self, manager):
+    def __init__(self, manager=None, base_path=None, loader=None):
         """
         Initializes the PlotManager instance with the provided manager object.
+        Headless PlotManagers (like in export.py) have no manager, but a base_path and a loader.
 
         Args:
             manager (object): The manager object that provides necessary functionality for the PlotManager.
+            base_path (str): Directory the data paths are relative to, defaults to the directory of the app.
+            loader (SQLLoader): The SQLLoader of the SQL data, defaults to the one of the app.
         """
         self.tracker = manager
+        self.base_path = base_path
+        self.loader = loader
 
         plt.rcParams.update(PLOT_RC_PARAMS)
 
@@ -49,11 +103,104 @@ class PlotManager:
                              '#bcbd22', '#17becf', '#aec7e8', '#ffbb78', '#98df8a', '#ff9896', '#c5b0d5', '#c49c94',
                              '#f7b6d2', '#c7c7c7', '#dbdb8d', '#9edae5']
 
+        self.job = 0
+        self.pending = None
+        self.results = queue.Queue()
+        self.shown = 0
+        self.polling = False
+        self.condition = threading.Condition()
+        self.worker = None
+        self.cache = PlotCache()
+        self.tracker_tail = CSVTailLoader()
+        self.render_mode = PLOT_RENDER_MODE
+
     def create_plot(self, dropdown_values, root):
-        """Gets the plot settings, loads the data and calls prepare_data and create_tkinter_plot with the right values.
-        Also configures the dropdown_values using DROPDOWN_CONTENT from menu_settings.
+        """Schedules a plot of the dropdown_values, it is prepared and rendered by the plot worker thread (render_plots)
+        and handed back to tkinter through self.results, which the Tk thread polls (poll_results) with root.after, so the
+        Tk main loop (and the tracking) never blocks on a plot and tkinter is only called from its own thread.
+        A newer call cancels the job currently rendered, and a burst of calls collapses into one job (the latest)."""
+        # The tracker data and the running session are copied on the Tk thread, they change every update
+        last_data, session = None, None
+        if dropdown_values[0] == list(DROPDOWN_CONTENT.keys())[0]:
+            last_data = list(self.tracker.last_data or [])
+        elif dropdown_values[0] == list(DROPDOWN_CONTENT.keys())[1]:
+            session = self.tracker.get_session()
+        with self.condition:
+            self.job += 1
+            self.pending = (self.job, dropdown_values, last_data, session)
+            self.condition.notify()
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.render_plots, name="PlotWorker", daemon=True)
+                self.worker.start()
+        if not self.polling:
+            self.polling = True
+            root.after(PLOT_POLL_RATE, self.poll_results, root)
+
+    def render_plots(self):
+        """The loop of the plot worker thread. Waits for a pending job and then PLOT_DEBOUNCE_TIME seconds longer,
+        until no newer job arrived in that time, so only the last of a burst of dropdown changes is rendered."""
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None)
+                while self.condition.wait(PLOT_DEBOUNCE_TIME):
+                    pass  # Notified: a newer job replaced the pending one, wait again
+                job, dropdown_values, last_data, session = self.pending
+                self.pending = None
+
+            try:
+                result = self.render_plot(job, dropdown_values, last_data, session)
+            except Exception as e:
+                print(f"Error while creating the plot: {e}")
+                result = None, None
+            if not self.is_cancelled(job):
+                self.results.put((job, *result))
+
+    def poll_results(self, root):
+        """Called on the Tk thread (via root.after), shows the plots the worker rendered since the last poll (show_plot).
+        Polls again every PLOT_POLL_RATE milliseconds until the result of the latest job was shown."""
+        while True:
+            try:
+                job, image, plot_type = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.shown = max(self.shown, job)
+            self.show_plot(job, image, plot_type)
+
+        self.polling = self.shown < self.job
+        if self.polling:
+            root.after(PLOT_POLL_RATE, self.poll_results, root)
+
+    def render_plot(self, job, dropdown_values, last_data=None, session=None):
+        """Gets the plot settings, loads the data, calls prepare_data and create_figure with the right values and renders
+        the figure with Agg. Runs in the plot worker thread, and stops as soon as the job is cancelled (by a newer one).
         It features using the SQL Data and loading both CSV Files (Tracker and Notifications).
-        If the plot type is heatmap then disable the part dropdowns, so no misconceptions over the part dropdowns not working are made (they dont affect heatmap plots)!"""
+        Plots whose data didn't change since they were rendered are served from self.cache, without loading anything.
+        :return: (The rendered plot as PNG bytes, plot type), (None, None) if there is no data or the job was cancelled."""
+        plot_settings = self.get_dropdown_plot_settings(dropdown_values)
+        plot_type = plot_settings[0]
+
+        # Cached Plot
+        key = self.get_cache_key(dropdown_values[0], plot_settings, last_data, session)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[1], plot_type
+
+        # Load and prepare Data
+        data = self.load_plot_data(dropdown_values, plot_settings, last_data, job, session)
+        if data is None:
+            return None, plot_type
+
+        # Create Plot
+        fig = self.create_figure(data, plot_settings)
+        if self.is_cancelled(job):
+            return None, plot_type
+        image = self.render_figure(fig)
+        self.cache.put(key, data, image)
+        return image, plot_type
+
+    @staticmethod
+    def get_dropdown_plot_settings(dropdown_values):
+        """Returns the plot settings (get_plot_settings) of the dropdown values, the Tracker source uses the plots of App Usage"""
         # Dropdown Keys
         dropdown_keys = list(DROPDOWN_CONTENT.keys())
         # Get Plot Settings
@@ -63,7 +210,14 @@ class PlotManager:
                 values[idx] = dropdown_keys[0]
                 continue
             values[idx] = dropdown_values[idx]
-        plot_settings = get_plot_settings(values)
+        return get_plot_settings(values)
+
+    def load_plot_data(self, dropdown_values, plot_settings, last_data=None, job=None, session=None):
+        """Loads the data of a plot from its source (the tracker data, the history, the sessions or the rollups, the
+        notifications) and prepares it with prepare_data. Stops as soon as the job is cancelled (None is never cancelled).
+        The session is the running session of the app (Tracker.get_session), None if there is none (e.g. headless).
+        :return: The prepared DataFrame, None if there is no data or the job was cancelled."""
+        dropdown_keys = list(DROPDOWN_CONTENT.keys())
 
         # Unpack Plot Settings
         if plot_settings[0] == 'heatmap':
@@ -73,53 +227,186 @@ class PlotManager:
             plot_type, x, y, hue, plot_name, x_name, y_name, legend_name, sort, time_range, part = plot_settings
             values = [x, y, hue]
 
-        # If heatmap disable TKManager's part dropdown
-        if plot_type == 'heatmap':
-            self.tracker.app.tk_manager.set_dropdowns('disabled', False, False, True,
-                                                      False)  # Only Part Dropdowns! Parameters: data, analysis, part, time
-
         # Load Data
         data = None
 
         if dropdown_values[0] == dropdown_keys[0]:
-            data = convert_last_data_to_dataframe(self.tracker.last_data)
-            data['timestamp'] = pd.to_datetime(data['timestamp'])
+            if not last_data:  # Nothing tracked yet (e.g. a fresh database)
+                return None
+            data = convert_last_data_to_dataframe(last_data)
+            data['timestamp'] = pd.to_datetime(data['timestamp'].map(datetime.fromtimestamp))  # Epoch (local time)
         elif dropdown_values[0] == dropdown_keys[1]:
-            data = self.load_tracker_data()
+            # Long time ranges use the pre-aggregated rollups, instead of parsing the whole history
+            # and short ones the session log, instead of parsing the CSV files
+            if time_range in ROLLUP_TIME_RANGES:
+                data = self.load_rollup_data(self.get_time_range_start(time_range), values)
+            elif time_range in SESSION_TIME_RANGES:
+                data = self.load_session_data(self.get_time_range_start(time_range), session)
+            else:
+                data = self.load_tracker_data(self.get_time_range_start(time_range))
         elif dropdown_values[0] == dropdown_keys[2]:
-            data = self.load_notification_data()
+            data = self.load_notification_data(self.get_time_range_start(time_range))
 
-        if data is None or data.empty:
-            if plot_type == 'heatmap':
-                self.tracker.app.tk_manager.set_dropdowns('normal', True, True, False, True)
-            else:
-                self.tracker.app.tk_manager.set_dropdowns('normal')
-            return
+        if data is None or data.empty or self.is_cancelled(job):
+            return None
 
         # Data processing steps
         data = self.prepare_data(data, plot_type, sort, time_range, part, values)
+        if self.is_cancelled(job):
+            return None
+        return data
 
-        # Create Plot
-        self.create_tkinter_plot(data, plot_settings, root)
-
-    def load_tracker_data(self):
-        """Loads and prepares the raw data from tracker.csv"""
-        tracker_abs_path = os.path.join(self.tracker.app.autostart_manager.current_abs_path[0], TRACKER_CSV_PATH)
-        if os.path.exists(tracker_abs_path):
-            data = pd.read_csv(tracker_abs_path)
-            data['timestamp'] = pd.to_datetime(data['timestamp'])
-            return data
-        return None
-
-    def load_notification_data(self):
-        """Loads and prepares the raw data from notifications.csv"""
-        notification_abs_path = os.path.join(self.tracker.app.autostart_manager.current_abs_path[0],
-                                             NOTIFICATION_CSV_PATH)
-        if os.path.exists(notification_abs_path):
-            data = pd.read_csv(notification_abs_path)
-            data['timestamp'] = pd.to_datetime(data['timestamp'])
-            return data
-        return None
+    def is_cancelled(self, job):
+        """Returns whether the job is stale, because a newer plot was requested since (None is never cancelled)"""
+        return job is not None and job != self.job
+
+    def get_cache_key(self, source, plot_settings, last_data=None, session=None):
+        """Returns the cache key of a plot: the data source, its version (get_data_version), the start of the time range
+        (to the minute, relative ranges like the last hour move on even if the data doesn't change) and the plot settings."""
+        time_range = plot_settings[-2]
+        start_time = self.get_time_range_start(time_range)
+        if start_time is not None:
+            start_time = start_time.replace(second=0, microsecond=0)
+        settings = tuple(tuple(value) if isinstance(value, list) else value for value in plot_settings)
+        return source, self.get_data_version(source, time_range, last_data, session), start_time, settings
+
+    def get_data_version(self, source, time_range, last_data=None, session=None):
+        """Returns the version of the data a plot of the source and time range is made of, it changes whenever the data does:
+        - App Usage: the (copied) tracker data itself, it only has one row per app.
+        - Tracker (rollup time ranges): the rollup version of the SQLLoader, it changes after every commit of rollups.
+        - Tracker (session time ranges): the session version of the SQLLoader and the (copied) running session.
+        - Tracker: size and mtime of the CSV files of the time range and of the columnar manifest.
+        - Notifications: the highest id of the SQL notification history, it grows with every import."""
+        dropdown_keys = list(DROPDOWN_CONTENT.keys())
+        if source == dropdown_keys[0]:
+            return tuple(tuple(row) for row in last_data or [])
+        if source == dropdown_keys[1] and time_range in ROLLUP_TIME_RANGES:
+            return self.get_loader().rollup_version
+        if source == dropdown_keys[1] and time_range in SESSION_TIME_RANGES:
+            return self.get_loader().session_version, tuple((session or {}).items())
+
+        if source == dropdown_keys[2]:
+            return self.get_loader().get_notification_history_version()
+
+        paths = get_csv_files(self.get_abs_path(TRACKER_CSV_PATH), self.get_time_range_start(time_range))
+        paths.append(os.path.join(self.get_abs_path(COLUMNAR_ROOT), MANIFEST_FILE))
+        return tuple(self.get_file_version(path) for path in paths)
+
+    @staticmethod
+    def get_file_version(path):
+        """Returns the version of a file as (path, size, mtime), (path, None, None) if it doesn't exist (anymore)"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return path, None, None
+        return path, stat.st_size, stat.st_mtime_ns
+
+    def get_abs_path(self, path):
+        """Returns the absolute path of a data path (like TRACKER_CSV_PATH), relative to the base_path or the app directory"""
+        base_path = self.base_path or self.tracker.app.autostart_manager.current_abs_path[0]
+        return os.path.join(base_path, path)
+
+    def get_loader(self):
+        """Returns the SQLLoader of the SQL data, self.loader or the one of the app"""
+        return self.loader or self.tracker.app.loader
+
+    def show_plot(self, job, image, plot_type):
+        """Called on the Tk thread (by poll_results) with the result of a job. Shows the image via
+        self.tracker.app.tk_manager.show_plot, unless the job was cancelled in the meantime."""
+        if self.is_cancelled(job):
+            return
+        self.tracker.app.tk_manager.show_plot(image, plot_type)  # Give plot_type to correctly handle Part Plots!
+
+    def load_tracker_data(self, start_time=None):
+        """Loads and prepares the raw data from the start_time on: the closed days from the memory-mapped columnar history,
+        only the days it doesn't cover yet (like today) from the tracker CSV files, which stay resident (only the rows
+        appended since the last load are parsed)"""
+        columnar_abs_path = self.get_abs_path(COLUMNAR_ROOT)
+        tracker_abs_path = self.get_abs_path(TRACKER_CSV_PATH)
+        columnar_data, covered_periods = load_columnar(columnar_abs_path, start_time, tracker_abs_path)
+        csv_data = self.load_resident_csv_files(TRACKER_CSV_PATH, start_time, covered_periods)
+        if columnar_data is None or csv_data is None:
+            return csv_data if columnar_data is None else columnar_data
+        return concat_frames([columnar_data, csv_data])
+
+    def load_rollup_data(self, start_time, values):
+        """Loads the pre-aggregated daily rows of the time range (from start_time on, None = all) from SQL, and converts
+        them into the format of tracker.csv with the CSV_SCHEMA dtypes. Plots of apps (app_name in the values) read the app
+        rollups, all others the category rollups (ROLLUP_PLOT_TABLES), their app_name is empty.
+        The activity is the level with the most seconds in the rows activity histogram."""
+        by_app = 'app_name' in values
+        start = int(start_time.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()) if start_time else 0
+        rows = self.get_loader().load_rollups(ROLLUP_PLOT_TABLES['app_name' if by_app else 'category'], start)
+        if not rows:
+            return None
+
+        rollups = pd.DataFrame(rows, columns=list(ROLLUP_TABLE_COLUMNS.keys()))
+        if by_app:
+            # The category of every app is only looked up once
+            codes, names = pd.factorize(rollups['name'])
+            categories = np.array([get_app_category(name) for name in names], dtype=object)[codes]
+            app_names = rollups['name']
+        else:
+            categories, app_names = rollups['name'], None
+        activity_columns = [f"activity_{level}" for level in ACTIVITY_LEVELS]
+        data = pd.DataFrame({'id': 0, 'timestamp': pd.to_datetime(rollups['bucket'].map(datetime.fromtimestamp)),
+                             'app_name': app_names, 'category': categories,
+                             'activity': rollups[activity_columns].idxmax(axis=1).str.replace('activity_', ''),
+                             'opened_time': rollups['opened_time'], 'active_time': rollups['active_time'],
+                             'total_active_time': rollups['total_active_time']})
+        return apply_csv_schema(data)[TRACKER_FIELDNAMES]
+
+    def load_session_data(self, start_time, session=None):
+        """Loads the sessions (foreground intervals) overlapping the time range from the SQL session log (an indexed range
+        query) and the running session, and converts them into the format of tracker.csv with the CSV_SCHEMA dtypes.
+        Every session is one row at its end (like the dumped rows), its length is the opened_time, its active seconds are
+        the active_time and total_active_time."""
+        columns = list(SESSIONS_TABLE_COLUMNS.keys())
+        rows = self.get_loader().load_sessions(int(start_time.timestamp()))
+        if session:
+            rows.append(tuple(session.get(column) for column in columns))
+        if not rows:
+            return None
+
+        sessions = pd.DataFrame(rows, columns=columns)
+        data = pd.DataFrame({'id': 0, 'timestamp': pd.to_datetime(sessions['end_time'].map(datetime.fromtimestamp)),
+                             'app_name': sessions['app_name'], 'category': sessions['category'],
+                             'activity': sessions['activity'],
+                             'opened_time': sessions['end_time'] - sessions['start_time'],
+                             'active_time': sessions['active_time'], 'total_active_time': sessions['active_time']})
+        return apply_csv_schema(data)[TRACKER_FIELDNAMES]
+
+    def load_notification_data(self, start_time=None):
+        """Loads the raw data from the start_time on from the SQL notification history (imported from the notification
+        CSV files, an indexed range query), converted into the format of notifications.csv with the CSV_SCHEMA dtypes
+        (categorical notification_type, app_name, category and activity)"""
+        rows = self.get_loader().load_notification_history(int(start_time.timestamp()) if start_time else 0)
+        if not rows:
+            return None
+
+        data = pd.DataFrame(rows, columns=list(NOTIFICATION_HISTORY_TABLE_COLUMNS.keys()))
+        data = data.drop(columns=['id', 'source']).rename(columns={'app_id': 'id', 'liked': 'like'})
+        data['timestamp'] = pd.to_datetime(data['timestamp'].map(datetime.fromtimestamp))  # Epoch (local time)
+        data['like'] = data['like'] == 'True'
+        return apply_csv_schema(data)[NOTIFICATION_FIELDNAMES]
+
+    def load_resident_csv_files(self, csv_path, start_time=None, skip_periods=()):
+        """Loads the files of a CSV stream (and the unrotated file) with data from the start_time on from self.tracker_tail,
+        which keeps them parsed in memory and only parses the rows appended since the last load (or the whole file, if it
+        was rewritten). Files with a time index are only parsed from the offset of the start_time on, and only the rows
+        from the start_time on are kept. Files of the skip_periods (days or months) are left out, and dropped from memory
+        like deleted files, so only the files the columnar history doesn't cover stay resident."""
+        csv_abs_path = self.get_abs_path(csv_path)
+        self.tracker_tail.retain(path for path in get_csv_files(csv_abs_path)
+                                 if get_csv_file_period(path) not in skip_periods)
+        frames = []
+        for path in get_csv_files(csv_abs_path, start_time):
+            if get_csv_file_period(path) in skip_periods:
+                continue
+            data = self.tracker_tail.load(path, start_time)
+            if data is not None:
+                frames.append(data if start_time is None else data[data['timestamp'] >= start_time])
+        return concat_frames(frames)
 
     def prepare_data(self, data, plot_type, sort, time_range, part, values):
         """Performs all data preparation steps"""
@@ -146,20 +433,30 @@ class PlotManager:
         # 7. Sort
         data = self.sort_data_by(data, sort)
 
-        # 8. Encode Data or Format time
+        # 8. Downsample dense series (before the time is formatted, while y is numeric)
+        if plot_type in DOWNSAMPLE_PLOT_TYPES:
+            data = self.downsample_data(data, values)
+
+        # 9. Encode Data or Format time
         if plot_type == 'heatmap':
-            # 8.1 Encode Data
+            # 9.1 Encode Data
             data = self.encode_data(data)
         else:
-            # 8.2 Format Time
-            if 'total_active_time' in data.columns:
+            # 9.2 Format Time (the fast render mode draws the seconds, create_figure formats the ticks instead)
+            if 'total_active_time' in data.columns and self.render_mode != 'fast':
                 data['total_active_time'] = data['total_active_time'].apply(format_time)
 
-        # 9. Drop Duplicates
+        # 10. Drop Duplicates
         data = data.drop_duplicates()
         if 'date' in values:
             data = data.drop_duplicates('date')
 
+            # 11. Format date labels
+            data = self.format_date_column(data, time_range)
+
+        # 12. Order categories
+        data = self.order_categories(data)
+
         return data
 
     def sort_data_by(self, data, sort):
@@ -173,7 +470,7 @@ class PlotManager:
         elif sort == 'total_messages':
             data = data.sort_values('total_messages', ascending=True)
         elif sort == 'activity':
-            data['num_activity'] = data['activity'].apply(lambda x: map_activity(x))
+            data['num_activity'] = map_activities(data['activity'])
             data = data.sort_values('num_activity', ascending=True)
             data = data.drop('num_activity', axis=1)
         elif sort == 'like':
@@ -191,14 +488,48 @@ class PlotManager:
 
         # Define aggregation functions for y-axis
         agg_funcs = {y: "sum"}
+        # Categoricals don't support sum, summed as strings (like before they were categorical)
+        if isinstance(data[y].dtype, pd.CategoricalDtype):
+            data = data.assign(**{y: data[y].astype(object)})
 
         if hue and hue in data.columns and not hue in [x, y]:
-            grouped_data = data.groupby([x, hue]).agg(agg_funcs).reset_index()
+            grouped_data = data.groupby([x, hue], observed=True).agg(agg_funcs).reset_index()
         else:
-            grouped_data = data.groupby(x).agg(agg_funcs).reset_index()
+            grouped_data = data.groupby(x, observed=True).agg(agg_funcs).reset_index()
 
         return grouped_data
 
+    @staticmethod
+    def downsample_data(data, values):
+        """Downsamples each series (hue) with LTTB (largest_triangle_three_buckets) to at most
+        PLOT_WIDTH * dpi * DOWNSAMPLE_POINTS_PER_PIXEL points, more points can't be told apart on the plot anyway, so the
+        drawing time stays about constant. Dates are used as numbers, other x values (like categories) by their order of
+        appearance. The rows keep their order, small data and non-numeric y values are returned unchanged."""
+        x, y, hue = values
+        max_points = int(PLOT_WIDTH * PLOT_RC_PARAMS['figure.dpi'] * DOWNSAMPLE_POINTS_PER_PIXEL)
+        if (max_points < 3 or len(data) <= max_points or x not in data.columns or y not in data.columns
+                or not pd.api.types.is_numeric_dtype(data[y])):
+            return data
+
+        if pd.api.types.is_datetime64_any_dtype(data[x]):
+            x_values = data[x].to_numpy().astype('datetime64[s]').astype(np.int64)
+        elif pd.api.types.is_numeric_dtype(data[x]):
+            x_values = data[x].to_numpy()
+        else:
+            x_values = pd.factorize(data[x])[0]
+        y_values = data[y].to_numpy(dtype=np.float64)
+
+        if hue and hue in data.columns and hue not in [x, y]:
+            series = data.groupby(hue, observed=True, sort=False).indices.values()
+        else:
+            series = [np.arange(len(data))]
+
+        keep = np.zeros(len(data), dtype=bool)
+        for positions in series:
+            positions = positions[np.argsort(x_values[positions], kind='stable')]
+            keep[positions[largest_triangle_three_buckets(x_values[positions], y_values[positions], max_points)]] = True
+        return data[keep]
+
     def filter_by_part(self, data, part):
         """
         Filter data based on user selection.
@@ -242,38 +573,41 @@ class PlotManager:
 
         return filtered_data
 
-    def filter_by_time_range(self, data, time_range):
-        """Filters data based on the selected time range"""
+    def get_time_range_start(self, time_range):
+        """Returns the start of the selected time range as datetime, or None if it is unbounded (total)"""
         now = datetime.now()
 
         time_filters = {"last_hour": now - timedelta(hours=1), "last_4_hours": now - timedelta(hours=4),
                         "today": now.replace(hour=0, minute=0, second=0, microsecond=0),
                         "this_week": now - timedelta(days=now.weekday()), "this_month": now.replace(day=1),
-                        "this_year": now.replace(month=1, day=1), "total": data['timestamp'].min()}
+                        "this_year": now.replace(month=1, day=1)}
+
+        return time_filters.get(time_range)
 
-        start_time = time_filters.get(time_range, data['timestamp'].min())
+    def filter_by_time_range(self, data, time_range):
+        """Filters data based on the selected time range"""
+        start_time = self.get_time_range_start(time_range)
+        if start_time is None:
+            start_time = data['timestamp'].min()
         return data[data['timestamp'] >= start_time]
 
     def create_date_column(self, data, time_range):
-        """Creates the date column based on the time range"""
-        if time_range in ['last_hour', 'last_4_hours']:
-            data['date'] = data['timestamp'].dt.strftime('%H:%M')
-        elif time_range == 'today':
-            data['date'] = data['timestamp'].dt.strftime('%H:%M')
-        elif time_range == 'this_week':
-            data['date'] = data['timestamp'].dt.strftime('%a %d.%m')
-        elif time_range == 'this_month':
-            data['date'] = data['timestamp'].dt.strftime('%d.%m')
-        elif time_range == 'this_year':
-            data['date'] = data['timestamp'].dt.strftime('%b %Y')
-        else:
-            data['date'] = data['timestamp'].dt.strftime('%d.%m.%Y')
+        """Creates the date column based on the time range: the start of the time bucket (DATE_BUCKETS) of each row, as
+        datetime. Truncating the datetime64 values is integer arithmetic, so grouping and sorting by date is cheap
+        (and chronological), the labels are only formatted for the final rows (format_date_column)"""
+        unit = DATE_BUCKETS.get(time_range, DATE_BUCKETS['total'])[0]
+        data['date'] = data['timestamp'].to_numpy().astype(f'datetime64[{unit}]').astype('datetime64[s]')
+        return data
 
+    def format_date_column(self, data, time_range):
+        """Formats the date buckets (see create_date_column) of the final rows as labels, e.g. '%H:%M' for today"""
+        label_format = DATE_BUCKETS.get(time_range, DATE_BUCKETS['total'])[1]
+        data['date'] = data['date'].dt.strftime(label_format)
         return data
 
     def add_productivity(self, data):
-        """Adds productivity score"""
-        data['productivity'] = data['category'].apply(get_productivity_by_category)
+        """Adds productivity score (categorical, looked up once per distinct category)"""
+        data['productivity'] = get_productivity_by_categories(data['category'])
         return data
 
     def calculate_message_count(self, data):
@@ -282,6 +616,18 @@ class PlotManager:
             data['notification_count'] = data.groupby('date')['notification_text'].transform('count')
         return data
 
+    @staticmethod
+    def order_categories(data):
+        """Orders the categories of the categorical columns (e.g. app_name from the columnar history) by their first
+        appearance in the rows and drops the unused ones. Seaborn orders categorical axes and hues by their categories
+        (and shows unused ones), so this keeps the order of the sorted rows, like for string columns."""
+        for column in data.columns:
+            if isinstance(data[column].dtype, pd.CategoricalDtype):
+                codes = data[column].cat.codes.to_numpy()
+                categories = data[column].cat.categories[pd.unique(codes[codes >= 0])]
+                data[column] = data[column].cat.set_categories(categories)
+        return data
+
     def encode_data(self, data):
         """Encodes values using the one_hot_encode, specifically targeting:
         - activity
@@ -293,8 +639,9 @@ class PlotManager:
         data = one_hot_encode(data, 'notification_type')
         return data
 
-    def create_tkinter_plot(self, data, plot_settings, root):
-        """Creates the Matplotlib plot and shows the canvas in tkinter via self.tracker.app.tk_manager.show_plot(plot).
+    def create_figure(self, data, plot_settings):
+        """Creates the Matplotlib figure of the plot. It is a standalone Figure (not managed by pyplot, which isn't
+        thread-safe), so it can be created in the plot worker thread.
         It features many different plot types, including:
         line, bar, scatter, heatmap, box, violin."""
 
@@ -306,7 +653,8 @@ class PlotManager:
             plot_type, x, y, hue, plot_name, x_name, y_name, legend_name, sort, time_range, part = plot_settings
 
         ## Plot
-        fig = plt.figure(figsize=(PLOT_WIDTH, PLOT_HEIGHT))
+        fig = Figure(figsize=(PLOT_WIDTH, PLOT_HEIGHT))
+        ax = fig.add_subplot()
         # Seaborn plot selection
         plot_methods = {"line": [sns.lineplot, {'estimator': sum, 'marker': 'X'}],
                         "bar": [sns.barplot, {'estimator': sum, 'width': 0.8}],
@@ -321,27 +669,31 @@ class PlotManager:
         plot_method = plot_methods[plot_type]
         plot_func = plot_method[0]
         if plot_type == 'heatmap':
-            plot_func(correlation, **plot_method[1])
+            plot_func(correlation, ax=ax, **plot_method[1])
         else:
-            if hue:
-                plot_func(data, x=x, y=y, hue=hue, palette=self.dark_palette or 'dark', **plot_method[1])
-            else:
-                plot_func(data, x=x, y=y, **plot_method[1])
+            # The fast render mode draws with plain Matplotlib, plots it can't draw fall back to seaborn
+            drawn = self.render_mode == 'fast' and self.draw_fast_plot(ax, data, plot_type, x, y, hue)
+            if not drawn:
+                if hue:
+                    plot_func(data, x=x, y=y, hue=hue, palette=self.dark_palette or 'dark', ax=ax, **plot_method[1])
+                else:
+                    plot_func(data, x=x, y=y, ax=ax, **plot_method[1])
+            if y == 'total_active_time' and pd.api.types.is_numeric_dtype(data[y]):
+                ax.yaxis.set_major_formatter(FuncFormatter(lambda seconds, _: format_time(seconds)))
 
             # Plot labels
-            plt.suptitle(plot_name, fontsize=PLOT_TITLE_SIZE, color=PLOT_TITLE_COLOR, fontweight='bold',
+            fig.suptitle(plot_name, fontsize=PLOT_TITLE_SIZE, color=PLOT_TITLE_COLOR, fontweight='bold',
                          fontstyle='italic')
-            plt.xlabel(x_name)
-            plt.ylabel(y_name)
-            plt.tight_layout()
-            plt.grid()
+            ax.set_xlabel(x_name)
+            ax.set_ylabel(y_name)
+            fig.tight_layout()
+            ax.grid()
 
             # Position legend
             if legend_name:
-                plt.legend(title=legend_name, loc='upper left', bbox_to_anchor=(0, 1))
+                ax.legend(title=legend_name, loc='upper left', bbox_to_anchor=(0, 1))
 
         # Rotation (Ticks)
-        ax = plt.gca()
         if len(ax.get_xticklabels()) > MAX_LENGTH_BEFORE_STRONG_ROTATION:
             for label in ax.get_xticklabels():
                 label.set_rotation(STRONG_ROTATION)
@@ -349,15 +701,188 @@ class PlotManager:
             for label in ax.get_xticklabels():
                 label.set_rotation(ROTATION)
 
-        # Create canvas
-        canvas = FigureCanvasTkAgg(fig, master=root)
-        canvas.draw()
-        self.tracker.app.tk_manager.show_plot(canvas, plot_type)  # Give plot_type to correctly handle Part Plots!
+        return fig
+
+    def draw_fast_plot(self, ax, data, plot_type, x, y, hue):
+        """Draws the plot with plain Matplotlib (the fast render mode), instead of seaborn. The data is already
+        aggregated (prepare_data sums y per x and hue), so it skips seaborn's bootstrapped confidence intervals, which
+        are meaningless for summed usage times and very slow on large data. The usage times stay numeric (seconds), their
+        ticks are formatted by create_figure. Categorical axes are drawn like seaborn does: one tick per category and
+        the y-axis inverted.
+        Box and violin plots are drawn as one PolyCollection each.
+        :return: Whether the plot was drawn, not for heatmaps and box or violin plots with a hue or non-numeric values."""
+        if plot_type in ('box', 'violin'):
+            if (hue and hue in data.columns) or not pd.api.types.is_numeric_dtype(data[y]):
+                return False
+        elif plot_type not in ('line', 'bar', 'scatter'):
+            return False
+
+        x_values, x_labels = self.get_axis_positions(data[x], categorical=plot_type in ('bar', 'box', 'violin'))
+        y_values, y_labels = self.get_axis_positions(data[y])
+        if hue and hue in data.columns:
+            hue_values, hue_labels = self.get_axis_positions(data[hue], categorical=True)
+            colors = [self.dark_palette[i % len(self.dark_palette)] for i in range(len(hue_labels))]
+        else:
+            hue_values, hue_labels = np.zeros(len(data)), [None]
+            colors = [plt.rcParams['axes.prop_cycle'].by_key()['color'][0]]
+        line_color = '#3f3f3f'  # Dark gray outlines of the box and violin plots, like seaborn's
+
+        # Bars of the hues side by side (dodged, 0.8 per x value), unless every x value has only one hue (like hue == x)
+        dodge = (plot_type == 'bar' and len(hue_labels) > 1
+                 and len(pd.unique(x_values + 1j * hue_values)) > len(pd.unique(x_values)))
+        width = 0.8 / len(hue_labels) if dodge else 0.8
+        for i, (label, color) in enumerate(zip(hue_labels, colors)):
+            mask = hue_values == i
+            if plot_type == 'line':
+                sums = pd.Series(y_values[mask]).groupby(x_values[mask]).sum()  # Sorted by x
+                ax.plot(sums.index, sums.to_numpy(), color=color, label=label, marker='X', markeredgecolor='w',
+                        markeredgewidth=0.75)
+            elif plot_type == 'bar':
+                sums = pd.Series(y_values[mask]).groupby(x_values[mask]).sum()
+                offset = (i - (len(hue_labels) - 1) / 2) * width if dodge else 0
+                ax.bar(sums.index + offset, sums.to_numpy(), width=width, color=sns.desaturate(color, 0.75),
+                       edgecolor='w', label=label)
+            elif plot_type == 'scatter':
+                ax.scatter(x_values[mask], y_values[mask], color=color, edgecolor='black', label=label)
+
+        if plot_type in ('box', 'violin'):
+            groups = [(position, y_values[(x_values == position) & ~np.isnan(y_values)])
+                      for position in range(len(x_labels))]
+            groups = [(position, group) for position, group in groups if len(group)]
+            polygons, lines, fliers = [], [], []
+            for position, group in groups:
+                q1, median, q3 = np.percentile(group, [25, 50, 75])
+                if plot_type == 'box':
+                    iqr = q3 - q1
+                    low, high = group[group >= q1 - 1.5 * iqr].min(), group[group <= q3 + 1.5 * iqr].max()
+                    polygons.append([(position - 0.4, q1), (position + 0.4, q1), (position + 0.4, q3),
+                                     (position - 0.4, q3)])
+                    lines += [[(position - 0.4, median), (position + 0.4, median)], [(position, low), (position, q1)],
+                              [(position, q3), (position, high)]]
+                    fliers += [(position, value) for value in group[(group < low) | (group > high)]]
+                elif np.ptp(group) == 0:  # No density to estimate, just the value
+                    lines.append([(position - 0.4, median), (position + 0.4, median)])
+                else:
+                    stats = cbook.violin_stats([group], lambda values, coords: mlab.GaussianKDE(values)(coords))[0]
+                    half_widths = 0.4 * stats['vals'] / stats['vals'].max()
+                    outline_x = np.concatenate([position - half_widths, (position + half_widths)[::-1]])
+                    outline_y = np.concatenate([stats['coords'], stats['coords'][::-1]])
+                    polygons.append(np.column_stack([outline_x, outline_y]))
+                    for quartile in (q1, median, q3):
+                        half_width = np.interp(quartile, stats['coords'], half_widths)
+                        lines.append([(position - half_width, quartile), (position + half_width, quartile)])
+
+            ax.add_collection(PolyCollection(polygons, facecolors=sns.desaturate(colors[0], 0.75),
+                                             edgecolors=line_color, linewidths=1.25))
+            ax.add_collection(LineCollection(lines, colors=line_color, linewidths=1.25,
+                                             linestyles='-' if plot_type == 'box' else '--'))
+            if fliers:
+                ax.plot(*zip(*fliers), linestyle='', marker='d', color=line_color)
+            ax.autoscale_view()
+
+        if x_labels is not None:
+            ax.set_xticks(np.arange(len(x_labels)), x_labels)
+            if plot_type in ('bar', 'box', 'violin'):
+                ax.set_xlim(-0.5, len(x_labels) - 0.5)
+                ax.xaxis.grid(False)
+        if y_labels is not None:
+            ax.set_yticks(np.arange(len(y_labels)), y_labels)
+            ax.invert_yaxis()
+        return True
 
     @staticmethod
-    def close_plot(plot):
-        """Closes the plot"""
-        plt.close(plot.figure)
+    def get_axis_positions(values, categorical=False):
+        """Returns the positions of the values on a plot axis and the tick labels, like seaborn. Numeric and datetime
+        values are their own positions (without labels), other values (and all values on categorical axes, like the
+        x-axis of bar plots) are categories at 0, 1, 2, ..., ordered like their categories, sorted if numeric and by
+        appearance otherwise."""
+        if not categorical and pd.api.types.is_datetime64_any_dtype(values):
+            return values.to_numpy(), None
+        if not categorical and pd.api.types.is_numeric_dtype(values):
+            return values.to_numpy(dtype=np.float64), None
+
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            levels = values.cat.categories
+        elif pd.api.types.is_numeric_dtype(values):
+            levels = np.sort(values.dropna().unique())
+        else:
+            levels = values.dropna().unique()
+        positions = pd.Categorical(values, categories=levels).codes.astype(np.float64)
+        positions[positions < 0] = np.nan
+        return positions, [str(level) for level in levels]
+
+    @staticmethod
+    def render_figure(fig, image_format='png'):
+        """Renders the figure with Agg and returns it as PNG bytes, which tkinter can show without any rendering.
+        Other formats Matplotlib can save (like 'svg' or 'pdf') are rendered by their own backends."""
+        buffer = io.BytesIO()
+        FigureCanvasAgg(fig).print_figure(buffer, format=image_format)
+        return buffer.getvalue()
+
+
+class PlotCache:
+    """
+    Bounded LRU cache of prepared plots, maps a cache key (PlotManager.get_cache_key) to (prepared DataFrame, PNG bytes).
+    The least recently used entries are evicted once the entries need more memory than the budget.
+
+    Attributes:
+        budget (int): Memory budget of all entries (in bytes), 0 disables the cache.
+        entries (OrderedDict): The cached entries, from the least to the most recently used, key -> (data, image, size).
+        size (int): Memory used by all entries (in bytes).
+        hits (int): Number of get calls which found their key.
+        misses (int): Number of get calls which didn't.
+        lock (threading.Lock): Guards the entries and counters, they are read outside the plot worker thread.
+
+    Methods:
+        get(self, key): Returns (data, image) of the key and marks it as recently used, None if it isn't cached.
+        put(self, key, data, image): Caches the prepared data and rendered image of the key, evicting the least recently used entries.
+        clear(self): Removes all entries.
+    """
+
+    def __init__(self, budget=PLOT_CACHE_SIZE):
+        """
+        Initializes the empty PlotCache.
+
+        Args:
+            budget (int): Memory budget of all entries (in bytes), 0 disables the cache.
+        """
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (data, image) of the key and marks it as the most recently used entry, None if it isn't cached"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, data, image):
+        """Caches the prepared data and the rendered image of the key, then evicts the least recently used entries until
+        all entries fit into the budget. Entries larger than the whole budget aren't cached."""
+        size = int(data.memory_usage(index=True, deep=True).sum()) + len(image or b'')
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[2]
+            if size > self.budget:
+                return
+            self.entries[key] = (data, image, size)
+            self.size += size
+            while self.size > self.budget:
+                self.size -= self.entries.popitem(last=False)[1][2]
+
+    def clear(self):
+        """Removes all entries, the counters are kept"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
 
 
 def get_plot_settings(values):
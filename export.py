@@ -0,0 +1,141 @@
+"""
+The export module renders the plots headless (without tkinter, with Matplotlib's Agg backend) into image files, e.g. for
+nightly usage reports of many machines, or as a rendering benchmark. Every combination of the PLOT_MAPPING analyses
+(for every data source) and time ranges is rendered in a process pool, each worker has its own PlotManager.
+Run it with the output directory, e.g. "python export.py reports --format png svg", "python export.py --help" lists all options.
+
+Important Methods:
+- get_export_jobs(sources: List[str], time_ranges: List[str], direction: str, part: str) -> List[List[str]]: Returns the dropdown values of every plot to export.
+- get_export_name(dropdown_values: List[str]) -> str: Returns the file name (without extension) of a plot.
+- init_worker(base_path: str, render_mode: str) -> None: Creates the headless PlotManager of a pool worker.
+- export_plot(dropdown_values: List[str], output_dir: str, formats: List[str]) -> Tuple: Renders one plot in a pool worker and writes its files.
+- export_plots(output_dir: str, base_path: str, formats: List[str], workers: int, jobs: List, render_mode: str) -> List[Tuple]: Renders all plots in a process pool.
+- main(argv: List[str]) -> None: The command-line entry point.
+"""
+
+import matplotlib
+
+matplotlib.use('Agg')  # Before anything imports pyplot, so no GUI backend (and no display) is needed
+
+import argparse
+import os
+import re
+import time
+from concurrent.futures import as_completed, ProcessPoolExecutor
+
+from data_analysis import PlotManager
+from menu_settings import DROPDOWN_CONTENT
+from plot_settings import PLOT_MAPPING, PLOT_RENDER_MODE, PLOT_RENDER_MODES
+from settings import NOTIFICATION_CSV_PATH, SQL_PATH
+from sql import CSVImporter, SQLLoader, SQLManager
+
+EXPORT_SOURCES = list(DROPDOWN_CONTENT.keys())[:3]  # App Usage (SQL), Tracker (history), Notifications
+EXPORT_FORMATS = ("png", "svg", "pdf")
+
+plot_manager = None  # The PlotManager of a pool worker (init_worker)
+
+
+def get_export_jobs(sources=None, time_ranges=None, direction="Top", part="Full"):
+    """Returns the dropdown values of every plot to export: all PLOT_MAPPING analyses of the sources (Tracker uses the
+    analyses of App Usage) for all time ranges (the keys of PLOT_MAPPING["Time"]), defaults to all of them."""
+    dropdown_keys = list(DROPDOWN_CONTENT.keys())
+    jobs = []
+    for source in sources or EXPORT_SOURCES:
+        analyses = PLOT_MAPPING[dropdown_keys[0] if source == dropdown_keys[1] else source]
+        for analysis in analyses:
+            for time_range in time_ranges or PLOT_MAPPING["Time"]:
+                jobs.append([source, analysis, time_range, direction, part])
+    return jobs
+
+
+def get_export_name(dropdown_values):
+    """Returns the file name (without extension) of a plot, e.g. tracker-most_used_apps-last_hour."""
+    source, analysis, time_range = dropdown_values[:3]
+    return "-".join(re.sub(r"[^a-z0-9]+", "_", value.lower()).strip("_") for value in (source, analysis, time_range))
+
+
+def init_worker(base_path, render_mode=PLOT_RENDER_MODE):
+    """Creates the headless PlotManager of a pool worker, with its own SQL connection (a connection can't be shared
+    between processes). The SQLLoader reads the tracker data (App Usage), the sessions and the rollups."""
+    global plot_manager
+    loader = SQLLoader(SQLManager(os.path.join(base_path, SQL_PATH), read_pool_size=1))
+    plot_manager = PlotManager(base_path=base_path, loader=loader)
+    plot_manager.render_mode = render_mode
+
+
+def export_plot(dropdown_values, output_dir, formats=("png",)):
+    """Renders the plot of the dropdown values in a pool worker and writes it into output_dir, once per format.
+    The data is loaded and prepared only once for all formats.
+    :return: (dropdown_values, written paths (empty if there is no data), seconds)."""
+    start = time.perf_counter()
+    last_data = list((plot_manager.get_loader().load_all_stats() or {}).values())
+    plot_settings = plot_manager.get_dropdown_plot_settings(dropdown_values)
+    data = plot_manager.load_plot_data(dropdown_values, plot_settings, last_data)
+    if data is None:
+        return dropdown_values, [], time.perf_counter() - start
+
+    fig = plot_manager.create_figure(data, plot_settings)
+    paths = []
+    for image_format in formats:
+        path = os.path.join(output_dir, f"{get_export_name(dropdown_values)}.{image_format}")
+        with open(path, mode='wb') as file:
+            file.write(plot_manager.render_figure(fig, image_format))
+        paths.append(path)
+    return dropdown_values, paths, time.perf_counter() - start
+
+
+def export_plots(output_dir, base_path, formats=("png",), workers=None, jobs=None, render_mode=PLOT_RENDER_MODE):
+    """Renders the plots of the jobs (dropdown values, defaults to get_export_jobs()) into output_dir, in a process pool
+    of workers processes (defaults to the number of CPUs), in the render_mode (PLOT_RENDER_MODES). The database is
+    initialized (migrated) and the new notification rows are imported once up front, so the workers only read.
+    Failed plots are printed and skipped.
+    :return: List of (dropdown_values, written paths, seconds) of the rendered plots, in the order they finished."""
+    jobs = get_export_jobs() if jobs is None else jobs
+    os.makedirs(output_dir, exist_ok=True)
+    sql_manager = SQLManager(os.path.join(base_path, SQL_PATH), read_pool_size=0)
+    SQLLoader(sql_manager)  # Creates and migrates the tables
+    CSVImporter(sql_manager).import_notification_files(os.path.join(base_path, NOTIFICATION_CSV_PATH))
+    sql_manager.close()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(base_path, render_mode)) as executor:
+        futures = {executor.submit(export_plot, values, output_dir, formats): values for values in jobs}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error while exporting the plot {get_export_name(futures[future])}: {e}")
+    return results
+
+
+def main(argv=None):
+    """The command-line entry point, renders the selected plots and prints how long they took."""
+    parser = argparse.ArgumentParser(description="Renders the TrackMind plots headless into image files.")
+    parser.add_argument("output_dir", help="Directory the images are written into.")
+    parser.add_argument("--root", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Directory of the app, which contains the data directory (default: this directory).")
+    parser.add_argument("--format", nargs="+", default=["png"], choices=EXPORT_FORMATS, dest="formats")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: number of CPUs).")
+    parser.add_argument("--sources", nargs="+", default=EXPORT_SOURCES, choices=EXPORT_SOURCES)
+    parser.add_argument("--time", nargs="+", default=list(PLOT_MAPPING["Time"]), choices=list(PLOT_MAPPING["Time"]),
+                        dest="time_ranges")
+    parser.add_argument("--direction", default="Top", choices=DROPDOWN_CONTENT["Direction"])
+    parser.add_argument("--part", default="Full", choices=DROPDOWN_CONTENT["Part"])
+    parser.add_argument("--mode", default=PLOT_RENDER_MODE, choices=PLOT_RENDER_MODES, dest="render_mode")
+    args = parser.parse_args(argv)
+
+    jobs = get_export_jobs(args.sources, args.time_ranges, args.direction, args.part)
+    start = time.perf_counter()
+    results = export_plots(args.output_dir, args.root, args.formats, args.workers, jobs, args.render_mode)
+    duration = time.perf_counter() - start
+
+    rendered = [seconds for _, paths, seconds in results if paths]
+    print(f"Exported {len(rendered)} of {len(jobs)} plots ({len(jobs) - len(results)} failed, "
+          f"{len(results) - len(rendered)} without data) in {duration:.2f}s")
+    if rendered:
+        print(f"Per plot: mean {sum(rendered) / len(rendered):.3f}s, max {max(rendered):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
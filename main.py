@@ -3,8 +3,9 @@ import signal
 import sys
 
 from autostart import AutostartManager
+from csv_util import CSVWriter, NOTIFICATION_FIELDNAMES, read_csv_files, TRACKER_FIELDNAMES
 from settings import *
-from sql import SQLManager, SQLLoader
+from sql import SQLManager, SQLLoader, SQLWriter
 from tkmanager import TKManager
 from tracker import Tracker
 
@@ -18,14 +19,17 @@ class App:
         autostart_manager: An instance of AutostartManager.
         tk_manager: An instance of TKManager.
         sql_manager: An instance of SQLManager.
+        sql_writer: An instance of SQLWriter if SQL_WRITER_THREAD is set, otherwise None.
         loader: An instance of SQLLoader.
+        tracker_csv: A CSVWriter for the tracker data (daily tracker-YYYY-MM-DD.csv files).
+        notification_csv: A CSVWriter for the notifications (daily notifications-YYYY-MM-DD.csv files).
         quiting: A boolean indicating whether the application is in the process of quitting.
 
     Methods:
         handle_exit(signum, frame): Handles the exit signal by calling self.quit() and then exiting the system.
         run(): Checks the data and then starts the app via Tracker.start.
         check_data(): Checks the data path, but does not check if images or other data is existent. If not, the app will crash!
-        quit(): Saves all important data before quitting the application and ends the signal reading to prevent it from being called twice.
+        quit(): Saves all important data and closes the database before quitting the application, and ends the signal reading to prevent it from being called twice.
     """
     def __init__(self):
         """
@@ -42,7 +46,16 @@ class App:
         sql_abs_path = os.path.join(self.autostart_manager.current_abs_path[0], SQL_PATH)
         self.autostart_manager.add_to_startup()
         self.sql_manager = SQLManager(sql_abs_path)
-        self.loader = SQLLoader(self.sql_manager)
+        self.sql_writer = SQLWriter(sql_abs_path) if SQL_WRITER_THREAD else None
+        self.loader = SQLLoader(self.sql_manager, writer=self.sql_writer)
+        tracker_csv_abs_path = os.path.join(self.autostart_manager.current_abs_path[0], TRACKER_CSV_PATH)
+        self.tracker_csv = CSVWriter(tracker_csv_abs_path, TRACKER_FIELDNAMES)
+        self.notification_csv = CSVWriter(
+            os.path.join(self.autostart_manager.current_abs_path[0], NOTIFICATION_CSV_PATH), NOTIFICATION_FIELDNAMES)
+        # Fill the rollup tables from the existing history (only at the first start)
+        self.loader.initialize_rollups(read_csv_files(tracker_csv_abs_path))
+        self.tracker.apply_retention()  # Downsample old history, also done every RETENTION_RATE seconds
+        self.tracker.import_csv_history()  # Only the rows appended since the last import are read
 
         self.quiting = False
 
@@ -72,7 +85,9 @@ class App:
 
     def quit(self):
         """Calls tracker.quit() to save all important data, and ends the signal reading to make sure it isn't called twice.
-        Not checks if atexit fires twice, this won't be prevented by this function!"""
+        Afterward the SQLManager (and its read pool) is closed, so if atexit fires again (after handle_exit) nothing is done."""
+        if self.sql_manager.closed:
+            return
         print("Saving data before quitting...")
 
         # Prevents Double Signal-Handler Calls
@@ -81,6 +96,12 @@ class App:
 
         # Save Data to SQL
         self.tracker.save_all()
+        self.tracker.save_session()
+        self.tracker.flush_csv(force=True)
+        self.loader.close()  # Write the buffered rows (and wait for the writer thread), else they would be lost
+        self.tracker_csv.close()  # Anything not flushed yet (the writer thread is already stopped)
+        self.notification_csv.close()
+        self.sql_manager.close()
 
 
 if __name__ == "__main__":
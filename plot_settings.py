@@ -9,6 +9,17 @@ Variables:
 - ROTATION, STRONG_ROTATION: Rotation angles for x-axis labels.
 - PLOT_RC_PARAMS: Dictionary containing overall design settings for the plots.
 - PLOT_MAPPING: Dictionary containing the plots that will be made in data_analysis.py, along with their important values.
+- ROLLUP_TIME_RANGES: Time ranges for which the tracker plots read the daily SQL rollups instead of tracker.csv.
+- ROLLUP_PLOT_TABLES: The daily rollup table (from settings.ROLLUP_TABLES) per key column, plots of apps read the app
+  rollups, all others the (much smaller) category rollups.
+- SESSION_TIME_RANGES: Time ranges for which the tracker plots read the SQL session log (and the running session) instead of tracker.csv.
+- DATE_BUCKETS: Dictionary mapping the time ranges to the bucket of the date column (a NumPy datetime unit) and the format of its labels.
+- PLOT_DEBOUNCE_TIME: Seconds without a new dropdown change before the plot worker starts rendering (collapses bursts).
+- PLOT_POLL_RATE: Milliseconds between the checks of the Tk thread for rendered plots, while a plot is being rendered.
+- PLOT_CACHE_SIZE: Memory budget of the LRU cache of prepared plots (in bytes), 0 disables the cache.
+- DOWNSAMPLE_PLOT_TYPES: Plot types whose series are downsampled with LTTB (Largest-Triangle-Three-Buckets) before drawing.
+- DOWNSAMPLE_POINTS_PER_PIXEL: Maximum points per series per horizontal pixel of the plot, 0 disables the downsampling.
+- PLOT_RENDER_MODES, PLOT_RENDER_MODE: The render modes, 'fast' draws the aggregated data with plain Matplotlib (no seaborn confidence intervals), 'seaborn' always uses seaborn.
 """
 
 import matplotlib.pyplot as plt
@@ -99,3 +110,26 @@ PLOT_MAPPING = {"App Usage": {
     "Time": {"Last Hour": {"filter": "last_hour"}, "Last 4 Hours": {"filter": "last_4_hours"},
              "Today": {"filter": "today"}, "This Week": {"filter": "this_week"}, "This Month": {"filter": "this_month"},
              "This Year": {"filter": "this_year"}, "Total": {"filter": "total"}}}
+
+# Date column, bucket (NumPy datetime unit: m = minute, D = day, M = month) and label format per time range
+DATE_BUCKETS = {"last_hour": ("m", "%H:%M"), "last_4_hours": ("m", "%H:%M"), "today": ("m", "%H:%M"),
+                "this_week": ("D", "%a %d.%m"), "this_month": ("D", "%d.%m"), "this_year": ("M", "%b %Y"),
+                "total": ("D", "%d.%m.%Y")}
+
+# Rollups
+ROLLUP_TIME_RANGES = ('this_year', 'total')
+ROLLUP_PLOT_TABLES = {"app_name": "rollup_daily_app", "category": "rollup_daily_category"}
+
+# Sessions, the session log keeps the full resolution (RETENTION_TIERS) longer than these ranges
+SESSION_TIME_RANGES = ('last_hour', 'last_4_hours', 'today')
+
+# Rendering
+PLOT_DEBOUNCE_TIME = 0.15
+PLOT_POLL_RATE = 50  # Milliseconds
+PLOT_CACHE_SIZE = 64 * 1024 * 1024  # Bytes, prepared DataFrames and rendered PNGs
+PLOT_RENDER_MODES = ('fast', 'seaborn')
+PLOT_RENDER_MODE = 'fast'  # Heatmaps (and plots fast can't draw) always use seaborn
+
+# Downsampling (LTTB), at most PLOT_WIDTH * dpi * DOWNSAMPLE_POINTS_PER_PIXEL points per series (577 by default)
+DOWNSAMPLE_PLOT_TYPES = ('line', 'scatter')
+DOWNSAMPLE_POINTS_PER_PIXEL = 0.5
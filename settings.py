@@ -4,7 +4,18 @@ The settings module contains various settings for the application.
 Variables:
 - ACTUALIZE_RATE: Rate at which the tracking should be performed (in seconds).
 - SQL_SAVE_RATE: Rate at which the tracker data should be saved to the SQL database (in minutes).
+- SQL_FLUSH_RATE: Rate at which the buffered (write-behind) SQL rows are written to the database in one transaction (in seconds). 0 writes every save directly.
+- SQL_FLUSH_SIZE: Maximum number of buffered (write-behind) SQL rows before they are written to the database, regardless of SQL_FLUSH_RATE.
+- SQL_WRITER_THREAD: Whether all SQL writes should be done in a separate writer thread (with its own connection).
+- SQL_WRITER_QUEUE_SIZE: Maximum number of queued commands of the writer thread, more will block until there is space.
+- SQL_READ_POOL_SIZE: Maximum number of read-only SQL connections used for analysis (plots and reports), they never block the tracker's writes (WAL).
+- SQL_DURABILITY: Durability profile of the SQL database, a key of SQL_DURABILITY_PROFILES ('strict', 'balanced' or 'relaxed').
+- SQL_DURABILITY_PROFILES: Dictionary mapping the durability profiles to their PRAGMA synchronous, wal_autocheckpoint (in pages) and checkpoint_rate (in seconds, 0 leaves the checkpoints to SQLite).
 - CSV_SAVE_RATE: Rate at which the tracker data should be saved to the CSV file (in minutes).
+- CSV_FLUSH_SIZE: Number of rows a CSVWriter buffers in memory before they are written to the file.
+- CSV_FLUSH_RATE: Maximum time rows stay buffered in a CSVWriter before they are written to the file (in seconds).
+- CSV_ARCHIVE_COMPRESSION_LEVEL: gzip compression level (1-9) of the monthly CSV archives, the daily files of closed months are compressed into them.
+- CSV_BATCH_SIZE: Number of rows per batch when the unrotated CSV file is split into the daily files (split_legacy_csv).
 - DATE_CHECK_RATE: Rate at which the current date should be checked (in seconds). It has to be at least 2 seconds shorter than the save rate, else it will not work properly.
 - AUTOCLICKER: Threshold for detecting autoclickers (in KPM).
 - VERY_ACTIVE: Threshold for detecting very active users (in KPM).
@@ -12,18 +23,35 @@ Variables:
 - MODERATE: Threshold for detecting moderately active users (in KPM).
 - PASSIVE: Threshold for detecting passive users (in KPM).
 - INACTIVE: Threshold for detecting inactive users (in seconds).
+- ACTIVITY_LEVELS: All activity levels, from the lowest to the highest.
 - ACTIVITY_RESET_TIME: How often the KPM are reset (in seconds).
+- RETENTION_TIERS: Tiers of (max age in days, resolution), older history is downsampled to the resolution of its tier ('full', 'hour' or 'day'). A max age of None keeps the data forever, data older than the last tier is deleted.
+- RETENTION_RATE: Rate at which the retention policy is applied while the app is running (in seconds), it is also applied at every start.
 - DATA_ROOT: Root directory for storing data.
 - AUTOSTART_METHOD: Method for autostarting the application ('registry' or 'other').
 - AUTOSTART_REGISTRY_NAME: Name for the autostart registry entry.
-- TRACKER_CSV_FILE: Name for the tracker CSV file.
-- NOTIFICATION_CSV_FILE: Name for the notifications CSV file.
+- TRACKER_CSV_FILE: Name for the tracker CSV file, the data is written into one file per day named after it (tracker-YYYY-MM-DD.csv).
+- NOTIFICATION_CSV_FILE: Name for the notifications CSV file, also rotated daily.
 - TRACKER_CSV_PATH: Path for the tracker CSV file.
 - NOTIFICATION_CSV_PATH: Path for the notifications CSV file.
+- COLUMNAR_ROOT: Directory of the columnar history (monthly .npy partitions and their manifest), converted from the closed daily tracker CSV files.
 - SQL_FILE: Name for the SQL database file.
 - SQL_PATH: Path for the SQL database file.
 - DEFAULT_TABLE_NAME: Default name for the SQL table.
 - TABLE_COLUMNS: Dictionary containing the columns for the SQL table.
+- TABLE_KEY_COLUMN: Column of the SQL table with a unique index, rows are upserted by it.
+- SESSIONS_TABLE_NAME: Name of the append-only SQL table with one row per foreground interval (session) of an app.
+- SESSIONS_TABLE_COLUMNS: Dictionary containing the columns for the sessions table (times are epoch seconds).
+- ROLLUP_TABLES: Dictionary mapping the rollup table names to their resolution ('hour' or 'day') and key column (app_name or category).
+- ROLLUP_TABLE_COLUMNS: Dictionary containing the columns for the rollup tables, summed times and an activity histogram (seconds per activity level).
+- HISTORY_TABLE_NAME: Name of the SQL table the tracker CSV history was imported into (dropped by migration 3, the plots use the columnar history).
+- HISTORY_TABLE_COLUMNS: Dictionary containing the columns for the history table (source is the id of the imported file).
+- NOTIFICATION_HISTORY_TABLE_NAME: Name of the SQL table the notifications CSV history is imported into, the Notifications plots read it.
+- NOTIFICATION_HISTORY_TABLE_COLUMNS: Dictionary containing the columns for the notification history table.
+- IMPORT_STATE_TABLE_NAME: Name of the SQL table storing how far (byte offset) each CSV file was imported.
+- IMPORT_STATE_TABLE_COLUMNS: Dictionary containing the columns for the import state table.
+- IMPORT_CHUNK_SIZE: Number of CSV rows imported (and committed) at once, bounds the memory use of the import.
+- IMPORT_ROWS_PER_TICK: Maximum number of CSV rows imported per import on the tkinter thread (without SQL_WRITER_THREAD), the rest follows at the next CSV flush.
 """
 
 import os
@@ -31,7 +59,22 @@ import os
 # Tracker
 ACTUALIZE_RATE = 1
 SQL_SAVE_RATE = 15
+SQL_FLUSH_RATE = 60  # Seconds, buffered rows are written in one transaction
+SQL_FLUSH_SIZE = 25  # Rows, flushes earlier if this many apps are buffered
+SQL_WRITER_THREAD = False  # Moves all SQL writes (and the CSV dump) out of the tkinter thread
+SQL_WRITER_QUEUE_SIZE = 64  # Commands
+SQL_READ_POOL_SIZE = 2  # Connections
+SQL_DURABILITY = "balanced"  # A crash may lose the last commits, but never corrupts the database
+SQL_DURABILITY_PROFILES = {
+    "strict": {"synchronous": "FULL", "wal_autocheckpoint": 1000, "checkpoint_rate": 0},  # Every commit is on disk
+    "balanced": {"synchronous": "NORMAL", "wal_autocheckpoint": 1000, "checkpoint_rate": 300},
+    "relaxed": {"synchronous": "OFF", "wal_autocheckpoint": 10000, "checkpoint_rate": 3600},  # OS crashes may corrupt
+}
 CSV_SAVE_RATE = 60
+CSV_FLUSH_SIZE = 200  # Rows
+CSV_FLUSH_RATE = 300  # Seconds
+CSV_ARCHIVE_COMPRESSION_LEVEL = 6
+CSV_BATCH_SIZE = 50000  # Rows
 DATE_CHECK_RATE = 1  # Has to be at least 2 seconds shorter than SAVE_RATE, else it will not work properly!
 
 # Activity Thresholds
@@ -42,8 +85,12 @@ MODERATE = 15  # KPM
 PASSIVE = 5  # KPM
 INACTIVE = 300  # seconds
 ACTIVITY_RESET_TIME = 100 # seconds, should be lower than the category_activity timer
+ACTIVITY_LEVELS = ('inactive', 'passive', 'moderate', 'active', 'very_active', 'autoclicker')
 
 ### Data
+# Retention
+RETENTION_TIERS = ((7, 'full'), (90, 'hour'), (None, 'day'))  # Days, full resolution for 7 days, hourly for 90 days
+RETENTION_RATE = 86400  # Seconds
 DATA_ROOT = "data"
 ## Autostart
 AUTOSTART_METHOD = 'registry'
@@ -53,6 +100,8 @@ TRACKER_CSV_FILE = "tracker.csv"
 NOTIFICATION_CSV_FILE = "notifications.csv"
 TRACKER_CSV_PATH = os.path.join(DATA_ROOT, TRACKER_CSV_FILE)
 NOTIFICATION_CSV_PATH = os.path.join(DATA_ROOT, NOTIFICATION_CSV_FILE)
+## Columnar
+COLUMNAR_ROOT = os.path.join(DATA_ROOT, "history")
 ## Sql
 # Path
 SQL_FILE = "app_usage"
@@ -63,3 +112,29 @@ TABLE_COLUMNS = {"id": "INTEGER PRIMARY KEY AUTOINCREMENT", "app_name": "TEXT NO
                  "timestamp": "INTEGER DEFAULT 0", "category": "TEXT NOT NULL", "activity": "TEXT NOT NULL",
                  "opened_time": "INTEGER DEFAULT 0", "active_time": "INTEGER DEFAULT 0",
                  "total_active_time": "INTEGER DEFAULT 0"}
+TABLE_KEY_COLUMN = "app_name"
+SESSIONS_TABLE_NAME = "sessions"
+SESSIONS_TABLE_COLUMNS = {"id": "INTEGER PRIMARY KEY AUTOINCREMENT", "app_name": "TEXT NOT NULL",
+                          "category": "TEXT NOT NULL", "start_time": "INTEGER NOT NULL",
+                          "end_time": "INTEGER NOT NULL", "active_time": "INTEGER DEFAULT 0",
+                          "keypresses": "INTEGER DEFAULT 0", "activity": "TEXT NOT NULL"}
+ROLLUP_TABLES = {"rollup_hourly_app": ("hour", "app_name"), "rollup_daily_app": ("day", "app_name"),
+                 "rollup_hourly_category": ("hour", "category"), "rollup_daily_category": ("day", "category")}
+ROLLUP_TABLE_COLUMNS = {"bucket": "INTEGER NOT NULL", "name": "TEXT NOT NULL", "opened_time": "INTEGER DEFAULT 0",
+                        "active_time": "INTEGER DEFAULT 0", "total_active_time": "INTEGER DEFAULT 0",
+                        **{f"activity_{level}": "INTEGER DEFAULT 0" for level in ACTIVITY_LEVELS}}
+HISTORY_TABLE_NAME = "tracker_history"
+HISTORY_TABLE_COLUMNS = {"id": "INTEGER PRIMARY KEY AUTOINCREMENT", "source": "INTEGER NOT NULL", "app_id": "INTEGER",
+                         "timestamp": "INTEGER NOT NULL", "app_name": "TEXT NOT NULL", "category": "TEXT",
+                         "activity": "TEXT", "opened_time": "INTEGER DEFAULT 0", "active_time": "INTEGER DEFAULT 0",
+                         "total_active_time": "INTEGER DEFAULT 0"}
+NOTIFICATION_HISTORY_TABLE_NAME = "notification_history"
+NOTIFICATION_HISTORY_TABLE_COLUMNS = {**HISTORY_TABLE_COLUMNS, "notification_text": "TEXT",
+                                      "notification_type": "TEXT", "liked": "TEXT"}
+IMPORT_STATE_TABLE_NAME = "import_state"
+IMPORT_STATE_TABLE_COLUMNS = {"id": "INTEGER PRIMARY KEY AUTOINCREMENT", "file": "TEXT NOT NULL UNIQUE",
+                              "byte_offset": "INTEGER DEFAULT 0", "length": "INTEGER DEFAULT 0",
+                              "checksum": "INTEGER DEFAULT 0", "size": "INTEGER DEFAULT 0",
+                              "mtime": "INTEGER DEFAULT 0"}
+IMPORT_CHUNK_SIZE = 5000  # Rows
+IMPORT_ROWS_PER_TICK = 20000  # Rows
@@ -1,6 +1,60 @@
+import csv
+import gzip
+import itertools
+import locale
+import queue
 import sqlite3 as sql
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
 
 from settings import *
+from csv_util import get_csv_files
+from util import get_bucket, to_epoch
+
+
+def migrate_epoch_timestamps(connection):
+    """
+    Migration 1: Converts the isoformat timestamps (local time) of the tracker table into integer epoch seconds,
+    and indexes them, so range filters in SQL can use the index.
+    """
+    connection.execute(f"UPDATE {DEFAULT_TABLE_NAME} SET timestamp = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) "
+                       f"WHERE typeof(timestamp) = 'text'")
+    connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{DEFAULT_TABLE_NAME}_timestamp ON {DEFAULT_TABLE_NAME} (timestamp)")
+
+
+def migrate_import_state_file_stats(connection):
+    """
+    Migration 2: Adds the size and mtime of the imported file to the import state, so unchanged files
+    (like the compressed monthly archives) are skipped without reading them.
+    """
+    if connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                          (IMPORT_STATE_TABLE_NAME,)).fetchone():
+        connection.execute(f"ALTER TABLE {IMPORT_STATE_TABLE_NAME} ADD COLUMN size INTEGER DEFAULT 0")
+        connection.execute(f"ALTER TABLE {IMPORT_STATE_TABLE_NAME} ADD COLUMN mtime INTEGER DEFAULT 0")
+
+
+def migrate_drop_tracker_history(connection):
+    """
+    Migration 3: Drops the SQL copy of the tracker CSV history, nothing read it (the tracker plots use the columnar
+    history and the rollups). The import states of its files (the ones without notification rows) are removed with it.
+    """
+    connection.execute(f"DROP TABLE IF EXISTS {HISTORY_TABLE_NAME}")
+    if not connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (IMPORT_STATE_TABLE_NAME,)).fetchone():
+        return
+    if connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                          (NOTIFICATION_HISTORY_TABLE_NAME,)).fetchone():
+        connection.execute(f"DELETE FROM {IMPORT_STATE_TABLE_NAME} WHERE id NOT IN "
+                           f"(SELECT DISTINCT source FROM {NOTIFICATION_HISTORY_TABLE_NAME})")
+    else:
+        connection.execute(f"DELETE FROM {IMPORT_STATE_TABLE_NAME}")
+
+
+# Schema migrations, the PRAGMA user_version of a database is the number of applied migrations. Only append to this!
+MIGRATIONS = [migrate_epoch_timestamps, migrate_import_state_file_stats, migrate_drop_tracker_history]
 
 
 class SQLLoader:
@@ -10,42 +64,126 @@ class SQLLoader:
     Attributes:
     - db_manager (SQLManager): An instance of SQLManager for managing the database connection.
     - table_name (str): Name of the table to load and save stats (default: DEFAULT_TABLE_NAME from menu_settings.py).
+    - flush_rate (int): Seconds between two flushes of the write-behind buffer (default: SQL_FLUSH_RATE from settings.py).
+    - flush_size (int): Number of buffered rows that forces a flush (default: SQL_FLUSH_SIZE from settings.py).
+    - dirty_rows (dict): The write-behind buffer, maps the key_value (e.g. the app_name) to (key_stat, stats).
+    - last_flush (float): The time of the last flush.
+    - writer (SQLWriter): Optional writer thread, if set all writes are queued to it instead of using db_manager.
+    - dirty_sessions (list): Sessions appended since the last flush, written in the same transaction as dirty_rows.
+    - dirty_rollups (dict): Rollup deltas of the saves since the last flush (see _add_rollups), they survive clear_table.
+    - in_flight (list): Flushed batches ([rows, sessions, clears, rollups]) which were queued to the writer, but aren't committed yet.
+    - lock (threading.Lock): Guards in_flight and the cache ids, which are also changed by the writer thread.
+    - cache (dict): The authoritative in-memory state of the table, maps the key_value to the row (tuple in TABLE_COLUMNS order).
+    - generation (int): Incremented on every change of the cache, so consumers can skip work if nothing changed.
+    - clears (int): Number of clear_table calls, used to ignore row ids of batches flushed before a clear.
+    - session_version (int): Incremented on every appended session, so consumers of load_sessions can skip work if nothing changed.
+    - rollup_version (int): Incremented after every commit which changed the rollup tables, so consumers of load_rollups can skip work if nothing changed.
 
     Methods:
     - clear_table(): Deletes all data in the table.
-    - _initialize_table(): Ensures the stats table exists in the database.
+    - _initialize_table(): Ensures the stats table exists in the database, and migrates the database to the latest schema.
     - save_stat(stat_name, value): Saves or updates a specific stat in the database.
-    - save_column(key_stat, key_value, stats): Saves or updates all stats in the database.
+    - save_column(key_stat, key_value, stats): Updates the cache and buffers the stats, they are written at the next flush.
+    - check_flush(): Flushes the buffer if the flush_rate has passed or the buffer reached flush_size.
+    - flush(): Writes all buffered rows to the database in one transaction (or queues them to the writer).
+    - close(): Flushes the buffer and stops the writer thread (if there is one).
     - load_stat(stat_name): Loads a specific stat from the database.
-    - load_column(stat_name, value): Loads a specific column from the database.
+    - load_column(stat_name, value): Loads a specific column from the cache.
     - save_all_stats(stats): Saves or updates all stats at once.
-    - load_all_stats(): Loads all stats from the database.
+    - load_all_stats(): Loads all stats from the cache.
+    - append_session(session): Buffers a finished session, it is appended to the sessions table at the next flush.
+    - load_sessions(start_time, end_time=None): Loads all sessions overlapping the time range (indexed range query).
+    - initialize_rollups(rows): Fills the empty rollup tables once from older (already saved) rows, e.g. from tracker.csv.
+    - load_rollups(table_name, start_time=0): Loads all rows of a rollup table from the start_time on.
+    - load_notification_history(start_time=0): Loads the imported notification rows from the start_time on (indexed range query).
+    - get_notification_history_version(): Returns the highest id of the notification history, it changes with every import.
+    - apply_retention(tiers=RETENTION_TIERS): Deletes the sessions and rollups older than their retention tier, then vacuums.
     """
-    def __init__(self, db_manager, table_name=DEFAULT_TABLE_NAME):
+    def __init__(self, db_manager, table_name=DEFAULT_TABLE_NAME, flush_rate=SQL_FLUSH_RATE, flush_size=SQL_FLUSH_SIZE,
+                 writer=None):
         """
         Initializes the SQLLoader with a reference to the SQLManager and table name.
         :param db_manager: An instance of SQLManager.
         :param table_name: Name of the table to load and save stats (default: DEFAULT_TABLE_NAME from menu_settings.py).
+        :param flush_rate: Seconds between two flushes of the write-behind buffer, 0 writes every save directly.
+        :param flush_size: Number of buffered rows that forces a flush.
+        :param writer: Optional SQLWriter, if given all writes are done in its thread (with its own connection).
         """
         self.db_manager = db_manager
         self.table_name = table_name
+        self.flush_rate = flush_rate
+        self.flush_size = flush_size
+        self.dirty_rows = {}
+        self.dirty_sessions = []
+        self.dirty_rollups = {}
+        self.last_flush = time.time()
+        self.writer = writer
+        self.in_flight = []
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.generation = 0
+        self.clears = 0
+        self.session_version = 0
+        self.rollup_version = 0
         self._initialize_table()
+        self._load_cache()
 
     def clear_table(self):
         """
-        Deletes all data in the table
+        Deletes all data in the table and the cache, buffered rows are discarded as well (they would be deleted anyway).
+        Their rollup deltas are kept, the rollups aren't cleared. If there is a writer, the delete is queued (the cache
+        is cleared directly).
         """
+        self.dirty_rows.clear()
+        with self.lock:
+            self.cache.clear()
+            self.clears += 1
+        self.generation += 1
         query = f"DELETE FROM {self.table_name}"
+        if self.writer:
+            with self.lock:
+                for batch in self.in_flight:
+                    batch[0] = {}  # The rows would be deleted by the queued clear anyway, sessions are kept
+
+            def clear(db_manager):
+                db_manager.query(query)
+                db_manager.commit()
+
+            self.writer.submit(clear)
+            return
+
         self.db_manager.query(query)
         self.db_manager.commit()
         self._initialize_table()
 
     def _initialize_table(self):
         """
-        Ensures the stats table exists in the database.
+        Ensures the stats table and the unique index on TABLE_KEY_COLUMN exist in the database.
+        Duplicate keys (only possible in databases from before the index) are removed first, keeping the newest row.
+        Then applies all missing MIGRATIONS (e.g. converting old timestamps to epoch seconds).
+        Also ensures the sessions table exists, with an index on its start_time for range queries.
         """
         columns = TABLE_COLUMNS
         self.db_manager.create_table(self.table_name, columns)
+        self.db_manager.query(f"DELETE FROM {self.table_name} WHERE id NOT IN "
+                              f"(SELECT MAX(id) FROM {self.table_name} GROUP BY {TABLE_KEY_COLUMN})")
+        self.db_manager.create_index(self.table_name, (TABLE_KEY_COLUMN,), unique=True)
+        self.db_manager.migrate()
+        self.db_manager.create_table(SESSIONS_TABLE_NAME, SESSIONS_TABLE_COLUMNS)
+        self.db_manager.create_index(SESSIONS_TABLE_NAME, ("start_time",))
+        for table_name in ROLLUP_TABLES:
+            self.db_manager.create_table(table_name, ROLLUP_TABLE_COLUMNS)
+            self.db_manager.create_index(table_name, ("bucket", "name"), unique=True)
+
+    def _load_cache(self):
+        """
+        Loads all rows of the table into the cache, this is the only full read of the table (at startup).
+        """
+        key_idx = list(TABLE_COLUMNS.keys()).index(TABLE_KEY_COLUMN)
+        rows = self.db_manager.fetch_all(f"SELECT * FROM {self.table_name} ORDER BY id")
+        with self.lock:
+            self.cache = {row[key_idx]: row for row in rows}
+        self.generation += 1
 
     def save_stat(self, stat_name, value):
         """
@@ -61,17 +199,151 @@ class SQLLoader:
 
     def save_column(self, key_stat, key_value, stats):
         """
-        Saves or updates all stats in the database.
+        Saves or updates all stats, using a write-behind buffer: the stats are kept in memory (keyed by key_value)
+        and written at the next flush, so repeated saves of the same key between two flushes become one write.
+        The cache is updated directly, so all loads see the new values. The key_stat should be TABLE_KEY_COLUMN.
+        The rollup deltas (the difference to the cached row) are accumulated in the same step, in dirty_rollups.
         :param key_stat: Name of the stat that will be checked (e.g., "score").
         :param key_value: Value of the stat that will be checked (e.g., 100).
         :param stats: Dictionary of stats to save, e.g., {
                       "score": 100, "damage": 20, "health": 80, "fire_rate": 5}
         """
-        existing = self.db_manager.fetch(f"SELECT * FROM {self.table_name} where {key_stat} = ? LIMIT 1", (key_value,))
-        if existing:
-            self.db_manager.update_object(stats, f"id = {existing[0]}", self.table_name)
+        if key_value in self.dirty_rows:
+            self.dirty_rows[key_value][1].update(stats)
         else:
-            self.db_manager.insert_object(self.table_name, stats)
+            self.dirty_rows[key_value] = (key_stat, dict(stats))
+        cached, row = self._update_cache(key_stat, key_value, stats)
+
+        columns = list(TABLE_COLUMNS.keys())
+        values = dict(zip(columns, row))
+        previous = dict(zip(columns, cached)) if cached else {}
+        deltas = {column: (values[column] or 0) - (previous.get(column) or 0)
+                  for column in ("opened_time", "active_time", "total_active_time")}
+        self._add_rollups(self.dirty_rollups, values, deltas)
+        self.check_flush()
+
+    def _update_cache(self, key_stat, key_value, stats):
+        """
+        Applies the stats to the cached row of key_value (creating it, without id, if it doesn't exist yet).
+        Increments self.generation if the row changed.
+        :return: (previous row or None, new row).
+        """
+        columns = list(TABLE_COLUMNS.keys())
+        with self.lock:
+            cached = self.cache.get(key_value)
+            row = list(cached) if cached else [None for _ in columns]
+            row[columns.index(key_stat)] = key_value
+            for column, value in stats.items():
+                row[columns.index(column)] = value
+            row = tuple(row)
+            self.cache[key_value] = row
+        if row != cached:
+            self.generation += 1
+        return cached, row
+
+    def check_flush(self):
+        """
+        Flushes the write-behind buffer if self.flush_rate seconds have passed since the last flush,
+        or if the buffer holds at least self.flush_size rows.
+        """
+        if len(self.dirty_rows) >= self.flush_size or time.time() - self.last_flush >= self.flush_rate:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered rows to the database in one transaction (only one commit).
+        If there is a writer, the batch is queued to it, its sessions stay visible to reads (in self.in_flight) until committed.
+        """
+        self.last_flush = time.time()
+        if not self.dirty_rows and not self.dirty_sessions and not self.dirty_rollups:
+            return
+
+        batch = [self.dirty_rows, self.dirty_sessions, self.clears, self.dirty_rollups]
+        self.dirty_rows, self.dirty_sessions, self.dirty_rollups = {}, [], {}
+        if self.writer:
+            with self.lock:
+                self.in_flight.append(batch)
+            self.writer.submit(lambda db_manager: self._write_batch(db_manager, batch))
+            return
+
+        self._write_batch(self.db_manager, batch)
+
+    def _write_batch(self, db_manager, batch):
+        """
+        Upserts all rows of the batch, appends its sessions, and commits them once (each with executemany).
+        The rollup tables are updated in the same transaction, with the deltas accumulated by save_column.
+        The key_stat needs a unique index, which is TABLE_KEY_COLUMN for the default table.
+        The commit holds self.lock and removes the batch from self.in_flight, so reads see its sessions exactly once,
+        and increments self.rollup_version if the batch had rollups (they are only visible to reads after the commit).
+        Rows which were new get their id in the cache (if the table wasn't cleared since the flush).
+        :param db_manager: The SQLManager to write with (self.db_manager or the one of the writer thread).
+        :param batch: [rows, sessions, clears, rollups], rows maps the key_value to (key_stat, stats), sessions is a list
+                      of dictionaries, clears is self.clears at the time of the flush and rollups the dirty_rollups.
+        """
+        rows, sessions, clears, rollups = batch
+        grouped = {}  # Rows with the same columns share one upsert_many
+        for key_value, (key_stat, stats) in rows.items():
+            values = {key_stat: key_value, **stats}
+            grouped.setdefault((key_stat, tuple(values.keys())), []).append(values)
+        for (key_stat, _), group in grouped.items():
+            db_manager.upsert_many(self.table_name, group, (key_stat,), commit=False)
+        self._write_rollups(db_manager, rollups)
+        db_manager.insert_many(SESSIONS_TABLE_NAME, sessions, commit=False)
+        with self.lock:
+            db_manager.commit()
+            self.in_flight = [in_flight for in_flight in self.in_flight if in_flight is not batch]
+            if rollups:
+                self.rollup_version += 1
+            db_manager.checkpoint()  # Periodic, depending on the durability profile
+            if clears == self.clears:
+                for key_value, (key_stat, _) in rows.items():
+                    cached = self.cache.get(key_value)
+                    if cached and cached[0] is None:
+                        row_id = db_manager.fetch(f"SELECT id FROM {self.table_name} WHERE {key_stat} = ?", (key_value,))
+                        self.cache[key_value] = (row_id[0] if row_id else None,) + cached[1:]
+
+    @staticmethod
+    def _add_rollups(rollups, values, deltas):
+        """
+        Adds the time deltas of a saved row to the bucket of its timestamp of every rollup table, in memory.
+        The opened_time delta is also added to the histogram column of the rows activity.
+        :param rollups: Dictionary mapping the rollup table names to {(bucket, name): rollup row}, it is updated.
+        :param values: The saved row (needs timestamp, app_name, category and activity).
+        :param deltas: Dictionary with the differences of opened_time, active_time and total_active_time.
+        """
+        if not any(deltas.values()) or values.get('timestamp') is None:
+            return
+
+        histogram = {f"activity_{level}": 0 for level in ACTIVITY_LEVELS}
+        if values.get('activity') in ACTIVITY_LEVELS and deltas['opened_time'] > 0:
+            histogram[f"activity_{values['activity']}"] = deltas['opened_time']
+
+        for table_name, (resolution, key_column) in ROLLUP_TABLES.items():
+            bucket = get_bucket(values['timestamp'], resolution)
+            rollup = rollups.setdefault(table_name, {}).get((bucket, values.get(key_column)))
+            if rollup:
+                for column, value in {**deltas, **histogram}.items():
+                    rollup[column] += value
+            else:
+                rollups[table_name][(bucket, values.get(key_column))] = {'bucket': bucket, 'name': values.get(key_column),
+                                                                         **deltas, **histogram}
+
+    @staticmethod
+    def _write_rollups(db_manager, rollups):
+        """
+        Adds the rollup rows (from _add_rollups) to the rollup tables, one upsert_many per table, without committing.
+        """
+        for table_name, table_rollups in rollups.items():
+            db_manager.upsert_many(table_name, table_rollups.values(), ('bucket', 'name'), commit=False, increment=True)
+
+    def close(self):
+        """
+        Flushes the write-behind buffer and stops the writer thread (after all queued writes are committed).
+        """
+        self.flush()
+        if self.writer:
+            self.writer.close()
+            self.writer = None
 
     def load_stat(self, stat_name):
         """
@@ -84,13 +356,16 @@ class SQLLoader:
 
     def load_column(self, stat_name, value):
         """
-        Loads a specific column from the database.
+        Loads a specific column from the cache (no SQL read).
         :param stat_name: Name of the stat that will be checked (e.g., "score").
         :param value: The Value that will be searched for
         :return: The value that was found or None
         """
-        result = self.db_manager.fetch(f"SELECT * FROM {self.table_name} where {stat_name} = ?", (value,))
-        return result if result else None
+        with self.lock:
+            if stat_name == TABLE_KEY_COLUMN:
+                return self.cache.get(value)
+            stat_idx = list(TABLE_COLUMNS.keys()).index(stat_name)
+            return next((row for row in self.cache.values() if row[stat_idx] == value), None)
 
     def save_all_stats(self, stats):
         """
@@ -106,10 +381,11 @@ class SQLLoader:
 
     def load_all_stats(self):
         """
-        Loads all stats from the database.
+        Loads all stats from the cache (no SQL read).
         :return: Dictionary of all stats or None if not found.
         """
-        result = self.db_manager.fetch_all(f"SELECT * FROM {self.table_name}")
+        with self.lock:
+            result = list(self.cache.values())
         if result:
             # keys = [description[0] for description in
             #         self.db_manager.query(f"PRAGMA table_info({self.table_name})").fetchall()]
@@ -118,39 +394,540 @@ class SQLLoader:
 
         return None
 
+    def append_session(self, session):
+        """
+        Buffers a finished session (foreground interval of an app), it is appended to the sessions table at the next flush.
+        :param session: Dictionary with the SESSIONS_TABLE_COLUMNS (without id), e.g., {
+                        "app_name": "code.exe", "start_time": 1760000000, "end_time": 1760000600, ...}
+        """
+        self.dirty_sessions.append(dict(session))
+        self.session_version += 1
+        self.check_flush()
+
+    def load_sessions(self, start_time, end_time=None):
+        """
+        Loads all sessions overlapping the time range, using the index on start_time. Uncommitted sessions are included.
+        :param start_time: Start of the range in epoch seconds.
+        :param end_time: End of the range in epoch seconds (default: no end).
+        :return: List of session rows (tuples in SESSIONS_TABLE_COLUMNS order), sorted by start_time.
+        """
+        end_time = end_time if end_time is not None else 2 ** 62
+        with self.lock:
+            result = self.db_manager.fetch_all_read_only(f"SELECT * FROM {SESSIONS_TABLE_NAME} WHERE start_time < ? AND "
+                                                         f"end_time >= ? ORDER BY start_time", (end_time, start_time))
+            pending = [session for batch in self.in_flight for session in batch[1]] + self.dirty_sessions
+        columns = list(SESSIONS_TABLE_COLUMNS.keys())
+        for session in pending:
+            if session['start_time'] < end_time and session['end_time'] >= start_time:
+                result.append(tuple(session.get(column) for column in columns))
+        return sorted(result, key=lambda row: row[columns.index('start_time')])
+
+    def initialize_rollups(self, rows):
+        """
+        Fills the rollup tables from older rows, but only if they are still empty (so only once, at the first start).
+        Every row has to be the amount of one interval, like the rows in tracker.csv (the table is cleared after each dump).
+        :param rows: Iterable of dictionaries with timestamp, app_name, category, activity and the time columns.
+        """
+        if self.db_manager.fetch(f"SELECT 1 FROM {next(iter(ROLLUP_TABLES))} LIMIT 1"):
+            return
+
+        rollups = {}  # Aggregated in memory first, so there is only one row per bucket and name
+        for row in rows:
+            try:
+                deltas = {column: int(float(row[column] or 0))
+                          for column in ("opened_time", "active_time", "total_active_time")}
+                self._add_rollups(rollups, row, deltas)
+            except (KeyError, ValueError, TypeError) as e:
+                print(f"Skipped invalid row while initializing the rollups: {e}")
+        self._write_rollups(self.db_manager, rollups)
+        self.db_manager.commit()
+        self.rollup_version += 1
+
+    def load_rollups(self, table_name, start_time=0):
+        """
+        Loads all rows of a rollup table from the start_time on.
+        :param table_name: Name of the rollup table, one of ROLLUP_TABLES.
+        :param start_time: Start in epoch seconds, compared to the bucket start.
+        :return: List of rows (tuples in ROLLUP_TABLE_COLUMNS order), sorted by bucket.
+        """
+        if table_name not in ROLLUP_TABLES:
+            raise ValueError(f"Invalid rollup table: {table_name}")
+        return self.db_manager.fetch_all_read_only(f"SELECT * FROM {table_name} WHERE bucket >= ? ORDER BY bucket",
+                                                   (start_time,))
+
+    def load_notification_history(self, start_time=0):
+        """
+        Loads the notification rows imported by the CSVImporter from the start_time on, using the index on timestamp.
+        :param start_time: Start in epoch seconds.
+        :return: List of rows (tuples in NOTIFICATION_HISTORY_TABLE_COLUMNS order), sorted by timestamp, empty if nothing
+                 was imported yet.
+        """
+        if not self.db_manager.fetch_all_read_only("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                                   (NOTIFICATION_HISTORY_TABLE_NAME,)):
+            return []
+        return self.db_manager.fetch_all_read_only(f"SELECT * FROM {NOTIFICATION_HISTORY_TABLE_NAME} "
+                                                   f"WHERE timestamp >= ? ORDER BY timestamp", (start_time,))
+
+    def get_notification_history_version(self):
+        """
+        Returns the highest id of the notification history (0 if there is none), every import (and re-import of a
+        rewritten or archived file) adds rows with higher ids, so it changes whenever the history does.
+        """
+        if not self.db_manager.fetch_all_read_only("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                                   (NOTIFICATION_HISTORY_TABLE_NAME,)):
+            return 0
+        result = self.db_manager.fetch_all_read_only(f"SELECT MAX(id) FROM {NOTIFICATION_HISTORY_TABLE_NAME}")
+        return result[0][0] or 0
+
+    def apply_retention(self, tiers=RETENTION_TIERS):
+        """
+        Applies the retention tiers to the history tables (in the writer thread, if there is one).
+        Every resolution is stored in its own tables: 'full' in the sessions table, 'hour' and 'day' in the rollups.
+        Data of a tier's resolution older than its max age is deleted (the coarser tables still hold its sums),
+        afterward the database is vacuumed to reclaim the space.
+        :param tiers: Tiers of (max age in days, resolution), like RETENTION_TIERS.
+        """
+        if self.writer:
+            self.writer.submit(lambda db_manager: self._apply_retention(db_manager, tiers))
+        else:
+            self._apply_retention(self.db_manager, tiers)
+
+    def _apply_retention(self, db_manager, tiers):
+        """
+        Deletes the history older than its retention tier and vacuums the database if anything was deleted.
+        The session and rollup versions are incremented if rows were deleted.
+        """
+        tables = {'full': [(SESSIONS_TABLE_NAME, 'end_time')],
+                  'hour': [(table_name, 'bucket') for table_name, (resolution, _) in ROLLUP_TABLES.items()
+                           if resolution == 'hour'],
+                  'day': [(table_name, 'bucket') for table_name, (resolution, _) in ROLLUP_TABLES.items()
+                          if resolution == 'day']}
+        deleted = 0
+        for max_age, resolution in tiers:
+            if max_age is None:
+                continue
+            cutoff = int(time.time() - max_age * 86400)
+            for table_name, column in tables[resolution]:
+                c = db_manager.query(f"DELETE FROM {table_name} WHERE {column} < ?", (cutoff,))
+                deleted += c.rowcount if c else 0
+        db_manager.commit()
+
+        if deleted:
+            with self.lock:
+                self.session_version += 1
+                self.rollup_version += 1
+            db_manager.query("VACUUM")
+
+
+class CSVImporter:
+    """
+    Streams the CSV history (notifications.csv) into indexed SQLite tables, so it can be queried (by the Notifications
+    plots) without loading the whole file. The import is resumable: the byte offset of the last imported line is stored
+    (in IMPORT_STATE_TABLE_NAME), so re-runs only read the appended rows. Memory use is bounded by the chunk size.
+    If the file was rewritten since the last import (e.g., by the retention policy), it is imported again from the start.
+    Files whose size and mtime didn't change are skipped, gzip archives are read decompressed (offsets in the decompressed data).
+    An optional row budget limits the work of one import (e.g. on the tkinter thread), the next import resumes.
+
+    Attributes:
+        db_manager: The SQLManager used for the import (of the main or the writer thread).
+        chunk_size (int): Number of rows inserted (and committed, with the offset) at once.
+        position (tuple): (byte offset, length, checksum) of the last read line of the current import.
+        budget (int): Number of rows which may still be imported, None for no limit.
+
+    Methods:
+        import_notification_files(csv_file): Imports the new rows of all files of the notification CSV stream.
+        import_notification_csv(csv_file): Imports the new rows of notifications.csv into NOTIFICATION_HISTORY_TABLE_NAME.
+        import_csv(csv_file, table_name, columns, converters): Imports the new rows of a CSV file into a table, returns the number of rows.
+        remove_missing_sources(table_names): Removes the rows and import states of files which don't exist anymore (e.g. archived daily files).
+    """
+    TRACKER_CONVERTERS = {"app_id": ("id", lambda value: int(value) if value else None), "timestamp": ("timestamp", to_epoch),
+                          "app_name": ("app_name", str), "category": ("category", str), "activity": ("activity", str),
+                          "opened_time": ("opened_time", lambda value: int(float(value or 0))),
+                          "active_time": ("active_time", lambda value: int(float(value or 0))),
+                          "total_active_time": ("total_active_time", lambda value: int(float(value or 0)))}
+    NOTIFICATION_CONVERTERS = {**TRACKER_CONVERTERS, "notification_text": ("notification_text", str),
+                               "notification_type": ("notification_type", str), "liked": ("like", str)}
+
+    def __init__(self, db_manager, chunk_size=IMPORT_CHUNK_SIZE, budget=None):
+        self.db_manager = db_manager
+        self.chunk_size = chunk_size
+        self.position = (0, 0, 0)
+        self.budget = budget
+
+    def import_notification_files(self, csv_file):
+        """
+        Imports the new rows of all files (daily files and monthly archives) of the notification CSV stream, after
+        removing the rows of files which don't exist anymore.
+        :param csv_file: The base path of the stream, like NOTIFICATION_CSV_PATH.
+        :return: The number of imported rows.
+        """
+        self.remove_missing_sources((NOTIFICATION_HISTORY_TABLE_NAME,))
+        return sum(self.import_notification_csv(path) for path in get_csv_files(csv_file))
+
+    def import_notification_csv(self, csv_file):
+        """
+        Imports the new rows of notifications.csv into NOTIFICATION_HISTORY_TABLE_NAME.
+        :return: The number of imported rows.
+        """
+        return self.import_csv(csv_file, NOTIFICATION_HISTORY_TABLE_NAME, NOTIFICATION_HISTORY_TABLE_COLUMNS,
+                               self.NOTIFICATION_CONVERTERS)
+
+    def import_csv(self, csv_file, table_name, columns, converters):
+        """
+        Imports the rows appended to csv_file since the last import into table_name, in chunks of self.chunk_size rows
+        (one executemany and one commit, together with the new offset, per chunk). An incomplete last line is left
+        for the next import, rows which can't be converted are skipped. Stops once the budget is used up.
+        :param csv_file: Path of the CSV file (with a header line).
+        :param table_name: Name of the table, it is created (with its indices) if it doesn't exist.
+        :param columns: Dictionary of the table columns and their types, has to include "source".
+        :param converters: Dictionary mapping the table columns to (CSV column, converter function).
+        :return: The number of imported rows.
+        """
+        if not os.path.exists(csv_file) or (self.budget is not None and self.budget <= 0):
+            return 0
+
+        self._initialize_tables(table_name, columns)
+        source_id, offset, length, checksum, size, mtime = self._load_state(csv_file)
+        stat = os.stat(csv_file)
+        if offset and (size, mtime) == (stat.st_size, stat.st_mtime_ns):
+            return 0  # Unchanged since the last import
+
+        encoding = locale.getpreferredencoding(False)  # The CSV files are written with the default encoding
+        imported = 0
+        with (gzip.open(csv_file, mode='rb') if csv_file.endswith(".gz") else open(csv_file, mode='rb')) as file:
+            header_line = file.readline()
+            if not header_line.endswith(b"\n"):
+                return 0
+            header = next(csv.reader([header_line.decode(encoding)]))
+            if offset and not self._is_unchanged(file, offset, length, checksum):
+                # The file was rewritten, its old rows are replaced by a complete import
+                self.db_manager.query(f"DELETE FROM {table_name} WHERE source = ?", (source_id,))
+                offset = 0
+            if not offset:
+                offset, length, checksum = len(header_line), len(header_line), zlib.crc32(header_line)
+                self._save_state(source_id, offset, length, checksum)
+                self.db_manager.commit()
+
+            file.seek(offset)
+            self.position = (offset, length, checksum)
+            chunk = []
+            for record in csv.reader(line.decode(encoding) for line in self._read_lines(file)):
+                row = dict(zip(header, record))
+                try:
+                    chunk.append({"source": source_id, **{column: converter(row[csv_column])
+                                                          for column, (csv_column, converter) in converters.items()}})
+                except (KeyError, ValueError, TypeError):
+                    pass  # Broken row (e.g., from an interrupted write)
+                if len(chunk) >= self.chunk_size or (self.budget is not None and len(chunk) >= self.budget):
+                    if not self._insert_chunk(table_name, chunk, source_id):
+                        return imported
+                    imported += len(chunk)
+                    chunk = []
+                    if self.budget is not None and self.budget <= 0:
+                        return imported  # Resumed by the next import, from the stored offset
+            if not self._insert_chunk(table_name, chunk, source_id):
+                return imported
+            imported += len(chunk)
+        # Everything up to the end was imported, the next import can skip the file while it is unchanged
+        self.db_manager.update_object({"size": stat.st_size, "mtime": stat.st_mtime_ns}, f"id = {source_id}",
+                                      IMPORT_STATE_TABLE_NAME)
+        return imported
+
+    def remove_missing_sources(self, table_names):
+        """
+        Removes the imported rows and the import states of all files which don't exist anymore
+        (e.g. daily files which were compressed into an archive, their rows are imported again from the archive).
+        :param table_names: Names of the tables the files were imported into.
+        """
+        self.db_manager.create_table(IMPORT_STATE_TABLE_NAME, IMPORT_STATE_TABLE_COLUMNS)
+        states = self.db_manager.fetch_all(f"SELECT id, file FROM {IMPORT_STATE_TABLE_NAME}")
+        missing = [(source_id,) for source_id, file in states if not os.path.exists(file)]
+        if not missing:
+            return
+
+        for table_name in table_names:
+            if self.db_manager.fetch("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)):
+                self.db_manager.connection.executemany(f"DELETE FROM {table_name} WHERE source = ?", missing)
+        self.db_manager.connection.executemany(f"DELETE FROM {IMPORT_STATE_TABLE_NAME} WHERE id = ?", missing)
+        self.db_manager.commit()
+
+    def _read_lines(self, file):
+        """
+        Yields the complete lines (bytes) of the file from its current position. self.position is kept at the
+        (byte offset, length, checksum) of the last yielded line, which is stored to resume the import.
+        """
+        while True:
+            line = file.readline()
+            if not line.endswith(b"\n"):
+                return  # End of the file, or a line which is still being written
+            self.position = (self.position[0] + len(line), len(line), zlib.crc32(line))
+            yield line
+
+    def _insert_chunk(self, table_name, chunk, source_id):
+        """
+        Inserts the rows of the chunk (insert_many) and stores the new offset, in one transaction.
+        :return: Whether it succeeded, if not nothing is stored (the chunk is imported again by the next run).
+        """
+        if chunk and self.db_manager.insert_many(table_name, chunk, commit=False) != len(chunk):
+            return False
+        self._save_state(source_id, *self.position)
+        self.db_manager.commit()
+        if self.budget is not None:
+            self.budget -= len(chunk)
+        return True
+
+    @staticmethod
+    def _is_unchanged(file, offset, length, checksum):
+        """
+        Checks if the last imported line (ending at offset) is still the same, otherwise the file was rewritten.
+        """
+        file.seek(offset - length)
+        return zlib.crc32(file.read(length)) == checksum
+
+    def _initialize_tables(self, table_name, columns):
+        """
+        Creates the table of the import (indexed by timestamp and app_name) and the state table, if they don't exist.
+        """
+        self.db_manager.create_table(table_name, columns)
+        self.db_manager.create_index(table_name, ("timestamp",))
+        self.db_manager.create_index(table_name, ("app_name", "timestamp"))
+        self.db_manager.create_index(table_name, ("source",))
+        self.db_manager.create_table(IMPORT_STATE_TABLE_NAME, IMPORT_STATE_TABLE_COLUMNS)
+
+    def _load_state(self, csv_file):
+        """
+        Loads (or creates) the import state of the file.
+        :return: (source id, offset, length, checksum) of the last imported line, and (size, mtime) of the file at the
+                 last complete import.
+        """
+        path = os.path.abspath(csv_file)
+        self.db_manager.query(f"INSERT OR IGNORE INTO {IMPORT_STATE_TABLE_NAME} (file) VALUES (?)", (path,))
+        self.db_manager.commit()
+        return self.db_manager.fetch(f"SELECT id, byte_offset, length, checksum, size, mtime "
+                                     f"FROM {IMPORT_STATE_TABLE_NAME} WHERE file = ?", (path,))
+
+    def _save_state(self, source_id, offset, length, checksum):
+        """
+        Stores the position after the last imported line, without committing (it's committed with the rows).
+        """
+        self.db_manager.update_object({"byte_offset": offset, "length": length, "checksum": checksum}, f"id = {source_id}",
+                                      IMPORT_STATE_TABLE_NAME, commit=False)
+
+
+class SQLWriter:
+    """
+    Runs all SQL write commands in a separate thread, which owns its own SQLManager (and so its own connection).
+    Commands are taken from a bounded queue, if it is full submit() blocks until there is space again (backpressure).
+
+    Attributes:
+        database_name (str): Path of the database the writer connects to.
+        commands (queue.Queue): The bounded queue of (command, callback) tuples.
+        thread (threading.Thread): The writer thread.
+
+    Methods:
+        submit(command, callback=None): Queues a command, which is called with the writers SQLManager.
+        run(): The loop of the writer thread, executes the queued commands until close() is called.
+        flush(): Blocks until all commands queued before were executed.
+        close(): Executes all queued commands, then stops the thread and closes its connection.
+    """
+    def __init__(self, database_name=SQL_PATH, queue_size=SQL_WRITER_QUEUE_SIZE):
+        """
+        Initializes the SQLWriter and starts its thread.
+        :param database_name: Path of the database.
+        :param queue_size: Maximum number of queued commands before submit() blocks.
+        """
+        self.database_name = database_name
+        self.commands = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, command, callback=None):
+        """
+        Queues a command, blocks if the queue is full.
+        :param command: Callable taking the writers SQLManager, e.g. lambda db_manager: db_manager.commit().
+        :param callback: Optional callable without parameters, called in the writer thread after the command ran.
+        """
+        if not self.thread.is_alive():
+            raise RuntimeError("The SQL writer is already closed.")
+        self.commands.put((command, callback))
+
+    def run(self):
+        """
+        The loop of the writer thread, executes the queued commands until the stop command (None) is received.
+        """
+        db_manager = SQLManager(self.database_name, read_pool_size=0)  # Created here, connections are per thread
+        while True:
+            command, callback = self.commands.get()
+            if command is None:
+                break
+            try:
+                command(db_manager)
+            except Exception as e:
+                print(f"SQL writer command failed: {e}")
+            if callback:
+                callback()
+        db_manager.close()
+
+    def flush(self):
+        """
+        Blocks until all commands queued before were executed (barrier, e.g. for tests or before reading elsewhere).
+        """
+        done = threading.Event()
+        self.submit(lambda db_manager: None, done.set)
+        done.wait()
+
+    def close(self):
+        """
+        Executes all queued commands, then stops the thread and closes its connection.
+        """
+        if self.thread.is_alive():
+            self.commands.put((None, None))
+            self.thread.join()
+
+
+class SQLReadPool:
+    """
+    A small pool of read-only SQLite connections for analysis and reporting.
+    With the database in WAL mode, reads on these connections run concurrently with the writes and never hold locks
+    the writer has to wait for. The connections can be used from any thread, but only by one at a time.
+
+    Attributes:
+        database_name (str): Path of the database.
+        size (int): Maximum number of connections, more readers wait until one is released.
+        idle (queue.LifoQueue): The currently unused connections.
+        created (int): Number of connections opened so far.
+        closed (bool): Whether close() was called, released connections are closed then.
+
+    Methods:
+        connection(): Context manager, acquires a connection and releases it afterward.
+        fetch_all(query, params=None): Fetches all rows of the result of a query on a pooled connection.
+        close(): Closes all idle connections, connections in use are closed when they are released.
+    """
+    def __init__(self, database_name=SQL_PATH, size=SQL_READ_POOL_SIZE):
+        """
+        Initializes the pool, connections are opened lazily (when needed).
+        :param database_name: Path of the database.
+        :param size: Maximum number of connections.
+        """
+        self.database_name = database_name
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """
+        Acquires a read-only connection (opening a new one if there are less than self.size) and releases it afterward.
+        """
+        if self.closed:
+            raise RuntimeError("The SQL read pool is already closed.")
+
+        connection = self._acquire()
+        try:
+            yield connection
+        finally:
+            if self.closed:
+                connection.close()
+            else:
+                self.idle.put(connection)
+
+    def _acquire(self):
+        """
+        Returns an idle connection, opens a new one if the pool isn't full, otherwise waits for one to be released.
+        """
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                uri = f"{Path(self.database_name).resolve().as_uri()}?mode=ro"
+                return sql.connect(uri, uri=True, check_same_thread=False)
+        return self.idle.get()
+
+    def fetch_all(self, query, params=None):
+        """
+        Executes a query on a pooled connection and fetches all rows of the result.
+        """
+        try:
+            with self.connection() as connection:
+                return connection.execute(query, params or ()).fetchall()
+        except sql.Error as e:
+            print(f"An error occurred: {e}")
+            return []
+
+    def close(self):
+        """
+        Closes all idle connections, connections in use are closed when they are released.
+        """
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
 
 class SQLManager:
     """
     Manages the connection and operations with a SQLite database.
+    File databases are switched to WAL mode, so the read pool can read while the connection writes.
+    How durable commits are is set by a profile of SQL_DURABILITY_PROFILES (synchronous mode and checkpoints).
 
     Attributes:
-        connection: The SQLite connection object.
+        connection: The SQLite connection object (None after close()).
+        read_pool: A SQLReadPool for analysis reads, or None (for in-memory databases or a read_pool_size of 0).
+        durability (str): Name of the durability profile (a key of SQL_DURABILITY_PROFILES).
+        checkpoint_rate (int): Seconds between two checkpoints by checkpoint(), 0 leaves them to SQLite.
+        last_checkpoint (float): The time of the last checkpoint by checkpoint().
 
     Methods:
         query(query, params=None): Executes a query with optional parameters.
         commit(): Commits the current transaction.
         fetch(query, params=None): Fetches the first row of the result of a query.
         fetch_all(query, params=None): Fetches all rows of the result of a query.
+        fetch_all_read_only(query, params=None): Fetches all rows of the result of a query, using the read pool if there is one.
         create_table(table_name=DEFAULT_TABLE_NAME, columns=None): Creates a table with the specified name and columns.
-        update_object(updates, condition, table_name=DEFAULT_TABLE_NAME): Updates an object in the table.
+        create_index(table_name=DEFAULT_TABLE_NAME, columns=None, unique=False): Creates an index on the specified columns.
+        apply_durability(durability): Applies a durability profile (PRAGMA synchronous and wal_autocheckpoint).
+        checkpoint(force=False): Checkpoints the WAL into the database file, if the checkpoint_rate has passed.
+        migrate(migrations=MIGRATIONS): Applies all migrations newer than the databases user_version in one transaction.
+        update_object(updates, condition, table_name=DEFAULT_TABLE_NAME, commit=True): Updates an object in the table.
         drop_table(table_name=DEFAULT_TABLE_NAME): Drops a table with the specified name.
-        insert_object(table_name=DEFAULT_TABLE_NAME, values=None): Inserts an object (row) into the specified table.
+        insert_object(table_name=DEFAULT_TABLE_NAME, values=None, commit=True): Inserts an object (row) into the specified table.
+        upsert_object(table_name=DEFAULT_TABLE_NAME, values=None, conflict_columns=None, commit=True, increment=False): Inserts an object (row), or updates (or increments) it if the unique conflict_columns already exist.
+        insert_many(table_name=DEFAULT_TABLE_NAME, rows=None, commit=True): Inserts many objects (rows) with executemany in one transaction, returns the row count.
+        upsert_many(table_name=DEFAULT_TABLE_NAME, rows=None, conflict_columns=None, commit=True, increment=False): Upserts many objects (rows) with executemany in one transaction, returns the row count.
         delete_object(table_name=DEFAULT_TABLE_NAME, condition=None): Deletes an object (row) from the specified table based on a condition.
-        close(): Closes the database connection.
+        close(): Closes the read pool and the database connection, can be called multiple times.
+        closed: Whether the SQLManager was closed.
         __del__(): Ensures the connection is closed when the object is deleted.
     """
-    def __init__(self, database_name=SQL_PATH):
+    def __init__(self, database_name=SQL_PATH, read_pool_size=SQL_READ_POOL_SIZE, durability=SQL_DURABILITY):
         """
         Initializes the SQLManager with a connection to the specified database.
+        :param database_name: Path of the database (or ":memory:").
+        :param read_pool_size: Maximum number of read-only connections, 0 disables the read pool.
+        :param durability: Name of the durability profile, a key of SQL_DURABILITY_PROFILES.
         """
+        self.read_pool = None
         self.connection = sql.connect(database_name)
+        self.last_checkpoint = time.time()
+        if database_name != ":memory:":
+            self.query("PRAGMA journal_mode=WAL")
+            if read_pool_size > 0:
+                self.read_pool = SQLReadPool(database_name, read_pool_size)
+        self.apply_durability(durability)
 
     def query(self, query, params=None):
         """
         Executes a query with optional parameters.
         """
-        c = self.connection.cursor()
         try:
+            c = self.connection.cursor()
             c.execute(query, params or ())
             return c
         except sql.Error as e:
@@ -181,6 +958,15 @@ class SQLManager:
         c = self.query(query, params)
         return c.fetchall() if c else []
 
+    def fetch_all_read_only(self, query, params=None):
+        """
+        Executes a read query on the read pool (without blocking writes) and fetches all rows of the result.
+        Uses the main connection if there is no read pool.
+        """
+        if self.read_pool:
+            return self.read_pool.fetch_all(query, params)
+        return self.fetch_all(query, params)
+
     def create_table(self, table_name=DEFAULT_TABLE_NAME, columns=None):
         """
         Creates a table with the specified name and columns.
@@ -196,18 +982,82 @@ class SQLManager:
         self.query(query)
         self.commit()
 
-    def update_object(self, updates, condition, table_name=DEFAULT_TABLE_NAME):
+    def create_index(self, table_name=DEFAULT_TABLE_NAME, columns=None, unique=False):
+        """
+        Creates an index on the specified columns, named after the table and columns.
+        :param table_name: Name of the table (default from menu_settings).
+        :param columns: Iterable of column names, e.g., ("app_name",).
+        :param unique: Whether the index should be unique (required for upsert_object).
+        """
+        if not columns:
+            raise ValueError("Columns are required to create an index.")
+
+        index_name = f"idx_{table_name}_{'_'.join(columns)}"
+        query = f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})"
+        self.query(query)
+        self.commit()
+
+    def apply_durability(self, durability):
+        """
+        Applies a durability profile to the connection (the setting is per connection).
+        :param durability: Name of the profile, a key of SQL_DURABILITY_PROFILES ("strict", "balanced" or "relaxed").
+        """
+        if durability not in SQL_DURABILITY_PROFILES:
+            raise ValueError(f"Invalid durability profile: {durability}")
+
+        profile = SQL_DURABILITY_PROFILES[durability]
+        self.durability = durability
+        self.checkpoint_rate = profile["checkpoint_rate"]
+        self.query(f"PRAGMA synchronous = {profile['synchronous']}")
+        self.query(f"PRAGMA wal_autocheckpoint = {profile['wal_autocheckpoint']}")
+
+    def checkpoint(self, force=False):
+        """
+        Checkpoints the WAL into the database file (PASSIVE, so readers are never blocked),
+        but only if the checkpoint_rate of the durability profile has passed.
+        :param force: Whether to checkpoint regardless of the checkpoint_rate.
+        """
+        if not force and (not self.checkpoint_rate or time.time() - self.last_checkpoint < self.checkpoint_rate):
+            return
+        self.last_checkpoint = time.time()
+        self.query("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def migrate(self, migrations=MIGRATIONS):
+        """
+        Upgrades the database in place: applies all migrations newer than its PRAGMA user_version in one transaction,
+        and sets the user_version to the number of migrations. If one fails, nothing is applied.
+        :param migrations: List of functions taking the connection, executed in order.
+        """
+        version = self.fetch("PRAGMA user_version")[0]
+        if version >= len(migrations):
+            return
+
+        self.commit()  # Makes sure the migrations are the only statements in the transaction
+        try:
+            self.connection.execute("BEGIN")
+            for migration in migrations[version:]:
+                migration(self.connection)
+            self.connection.execute(f"PRAGMA user_version = {len(migrations)}")
+            self.connection.commit()
+            print(f"Migrated database from version {version} to {len(migrations)}")
+        except sql.Error as e:
+            self.connection.rollback()
+            print(f"Migration failed, database stays at version {version}: {e}")
+
+    def update_object(self, updates, condition, table_name=DEFAULT_TABLE_NAME, commit=True):
         """
         Updates an object in the table.
         :param table_name: Name of the table.
         :param updates: Dictionary of column-value pairs to update.
                         Example: {"name": "Alice", "age": 35}
         :param condition: SQL condition as a string, e.g., "id = 1".
+        :param commit: Whether to commit directly, False keeps the statement in the current transaction.
         """
         set_clause = ", ".join(f"{col} = ?" for col in updates.keys())
         query = f"UPDATE {table_name} SET {set_clause} WHERE {condition}"
         self.query(query, tuple(updates.values()))
-        self.commit()
+        if commit:
+            self.commit()
 
     def drop_table(self, table_name=DEFAULT_TABLE_NAME):
         """
@@ -218,12 +1068,13 @@ class SQLManager:
         self.query(query)
         self.commit()
 
-    def insert_object(self, table_name=DEFAULT_TABLE_NAME, values=None):
+    def insert_object(self, table_name=DEFAULT_TABLE_NAME, values=None, commit=True):
         """
         Inserts an object (row) into the specified table.
         :param table_name: Name of the table (default from menu_settings).
         :param values: Dictionary of column-value pairs to insert.
                        Example: {"name": "Alice", "age": 30}
+        :param commit: Whether to commit directly, False keeps the statement in the current transaction.
         """
         if not values:
             raise ValueError("Values are required to insert an object.")
@@ -232,7 +1083,98 @@ class SQLManager:
         placeholders = ", ".join("?" for _ in values)
         query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
         self.query(query, tuple(values.values()))
-        self.commit()
+        if commit:
+            self.commit()
+
+    def upsert_object(self, table_name=DEFAULT_TABLE_NAME, values=None, conflict_columns=None, commit=True,
+                      increment=False):
+        """
+        Inserts an object (row), or updates the existing one, in one statement (INSERT ... ON CONFLICT DO UPDATE).
+        :param table_name: Name of the table (default from menu_settings).
+        :param values: Dictionary of column-value pairs to insert or update.
+                       Example: {"name": "Alice", "age": 30}
+        :param conflict_columns: Columns with a unique index that identify the row, e.g., ("name",).
+        :param commit: Whether to commit directly, False keeps the statement in the current transaction.
+        :param increment: Whether existing values are incremented by the new ones (e.g., for sums), instead of replaced.
+        """
+        if not values:
+            raise ValueError("Values are required to upsert an object.")
+        if not conflict_columns:
+            raise ValueError("Conflict columns are required to upsert an object.")
+
+        columns = ", ".join(values.keys())
+        placeholders = ", ".join("?" for _ in values)
+        new_value = "{col} + excluded.{col}" if increment else "excluded.{col}"
+        updates = ", ".join(f"{col} = {new_value.format(col=col)}" for col in values.keys() if col not in conflict_columns)
+        on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        query = (f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders}) "
+                 f"ON CONFLICT({', '.join(conflict_columns)}) {on_conflict}")
+        self.query(query, tuple(values.values()))
+        if commit:
+            self.commit()
+
+    def insert_many(self, table_name=DEFAULT_TABLE_NAME, rows=None, commit=True):
+        """
+        Inserts many objects (rows) with one prepared statement (executemany), in one transaction.
+        :param table_name: Name of the table (default from menu_settings).
+        :param rows: Iterable (or generator) of dictionaries with the same column-value pairs.
+                     Example: [{"name": "Alice", "age": 30}, {"name": "Bob", "age": 25}]
+        :param commit: Whether to commit directly, False keeps the statements in the current transaction.
+        :return: The number of inserted rows (0 if it failed, then the current transaction is rolled back).
+        """
+        def build_query(columns):
+            return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+        return self._execute_many(build_query, rows, commit)
+
+    def upsert_many(self, table_name=DEFAULT_TABLE_NAME, rows=None, conflict_columns=None, commit=True,
+                    increment=False):
+        """
+        Inserts many objects (rows), or updates the existing ones, with one prepared statement (executemany),
+        in one transaction. See upsert_object.
+        :param table_name: Name of the table (default from menu_settings).
+        :param rows: Iterable (or generator) of dictionaries with the same column-value pairs.
+        :param conflict_columns: Columns with a unique index that identify the rows, e.g., ("name",).
+        :param commit: Whether to commit directly, False keeps the statements in the current transaction.
+        :param increment: Whether existing values are incremented by the new ones (e.g., for sums), instead of replaced.
+        :return: The number of inserted or updated rows (0 if it failed, then the current transaction is rolled back).
+        """
+        if not conflict_columns:
+            raise ValueError("Conflict columns are required to upsert objects.")
+
+        def build_query(columns):
+            new_value = "{col} + excluded.{col}" if increment else "excluded.{col}"
+            updates = ", ".join(f"{col} = {new_value.format(col=col)}" for col in columns if col not in conflict_columns)
+            on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+            return (f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+                    f"ON CONFLICT({', '.join(conflict_columns)}) {on_conflict}")
+
+        return self._execute_many(build_query, rows, commit)
+
+    def _execute_many(self, build_query, rows, commit):
+        """
+        Executes the query built from the columns of the first row for all rows, with executemany.
+        :param build_query: Function taking the column names and returning the query.
+        :param rows: Iterable (or generator) of dictionaries, all with the columns of the first one.
+        :param commit: Whether to commit directly.
+        :return: The number of changed rows (cursor.rowcount), 0 if there were no rows or it failed.
+        """
+        rows = iter(rows or ())
+        first = next(rows, None)
+        if first is None:
+            return 0
+
+        columns = tuple(first.keys())
+        params = (tuple(row[col] for col in columns) for row in itertools.chain((first,), rows))
+        try:
+            c = self.connection.executemany(build_query(columns), params)
+            if commit:
+                self.connection.commit()
+            return c.rowcount
+        except (sql.Error, KeyError) as e:
+            self.connection.rollback()
+            print(f"An error occurred: {e}")
+            return 0
 
     def delete_object(self, table_name=DEFAULT_TABLE_NAME, condition=None):
         """
@@ -247,11 +1189,23 @@ class SQLManager:
         self.query(query)
         self.commit()
 
+    @property
+    def closed(self):
+        """
+        Returns whether the SQLManager was closed.
+        """
+        return getattr(self, 'connection', None) is None
+
     def close(self):
         """
-        Closes the database connection.
+        Closes the read pool and the database connection, does nothing if they are already closed.
         """
-        self.connection.close()
+        if getattr(self, 'read_pool', None):
+            self.read_pool.close()
+            self.read_pool = None
+        if not self.closed:
+            self.connection.close()
+            self.connection = None
 
     def __del__(self):
         """
@@ -1,4 +1,3 @@
-import datetime
 import time
 
 from settings import *
@@ -18,6 +17,9 @@ class TimeManager:
         last_activity_time (float): The time of the last activity (keypress or app swap).
         subtracted_time (int): The time subtracted from the active time to calculate the total active time correctly.
         keypress_time (int): How long the key-presses are tracked (will be reset every ACTIVITY_RESET_TIME seconds)
+        session_start (int): Epoch seconds at which the current app came into the foreground (start of the session).
+        session_active_time (int): The time the current session has been actively used in seconds.
+        session_kp (int): The number of key-presses in the current session (never reset by ACTIVITY_RESET_TIME).
 
     Methods:
         reset_times(app=None): Resets the active, opened, total_active, and last_activity time, also resets the key-presses.
@@ -26,7 +28,9 @@ class TimeManager:
         check_inactivity(): Checks if the user is inactive based on the last activity, uses values like TimeManager.subtracted_time (self.subtracted_time) to calculate correct values for active and total_active time.
         kpm: Returns the current key-presses divided by the active time and multiplied by 60 (to get to minutes).
         reset_kpm: Resets the key-presses (kp) and the keypress-time timer
-        timestamp: Returns the current datetime as timestamp in isoformat.
+        reset_session(): Starts a new session, resetting session_start, session_active_time and session_kp.
+        session_kpm: Returns the key-presses per minute over the whole current session.
+        timestamp: Returns the current time as integer epoch seconds.
         load_time(opened_time, active_time, total_active_time): Actualizes time values to new values: opened_time, active_time, and total_active_time.
         update(): Called regularly to update the times.
     """
@@ -47,6 +51,7 @@ class TimeManager:
         self.subtracted_time = 0  # Used to calculate self.total_active_time correctly
         self.kp = 0  # Key-presses
         self.keypress_time = 0  # Used to calculate Key-presses
+        self.reset_session()
 
     def reset_times(self, app=None):
         """Resets the active, opened, total_active and last_activity time, also resets the key-presses."""
@@ -59,11 +64,13 @@ class TimeManager:
         """Called when a key is pressed. Updates the active time and key-presses."""
         self.last_activity_time = time.time()  # Set the current time as the last activity
         self.kp += 1
+        self.session_kp += 1
 
     def on_app_swap(self, app):
         """Called when the app is swapped. Saves and resets the times. Also resets the KPM."""
         self.reset_times(app)  # Reset the times whenever the app is swapped
         self.reset_kpm()
+        self.reset_session()
 
     def check_inactivity(self):
         """Checks if the user is inactive based on the last activity, if so then sets self.inactive to True,
@@ -79,6 +86,7 @@ class TimeManager:
             self.inactive = True
             self.active_time = 0  # Reset Active Time, but not total_active_time
             self.total_active_time -= inactive_time - self.subtracted_time
+            self.session_active_time -= inactive_time - self.subtracted_time
             self.subtracted_time = inactive_time - self.subtracted_time
             self.reset_kpm()
         else:
@@ -86,6 +94,7 @@ class TimeManager:
             self.subtracted_time = 0
             self.active_time += 1  # Otherwise, count 1 second of active time
             self.total_active_time += 1  # Count the total active time, won't be reset if inactive
+            self.session_active_time += 1
             if self.keypress_time < ACTIVITY_RESET_TIME:
                 self.keypress_time += 1
             else:
@@ -101,10 +110,21 @@ class TimeManager:
         self.kp = 0
         self.keypress_time = 0
 
+    def reset_session(self):
+        """Starts a new session at the current time, resets self.session_active_time and self.session_kp"""
+        self.session_start = int(time.time())
+        self.session_active_time = 0
+        self.session_kp = 0
+
+    @property
+    def session_kpm(self):
+        """Returns the key-presses of the current session divided by its active time and multiplied by 60."""
+        return int((self.session_kp / max(self.session_active_time, 1)) * 60)
+
     @property
     def timestamp(self):
-        """Returns the current datetime as timestamp in isoformat."""
-        return datetime.datetime.now().isoformat()
+        """Returns the current time as integer epoch seconds (like the timestamp column in SQL)."""
+        return int(time.time())
 
     def load_time(self, opened_time, active_time, total_active_time):
         """Actualizes time values to new values:
@@ -1,3 +1,4 @@
+import base64
 import tkinter as tk
 from tkinter import ttk
 
@@ -29,8 +30,8 @@ class TKManager:
     - add_listbox(self, x, y, height=5, width=30, items=None, frame=None): Creates a listbox with the given items and dimensions, and places it at the specified coordinates in the given frame.
     - add_dropdown(self, values, x, y, func=None, default_index=0, frame=None): Creates a styled dropdown (OptionMenu) with the given values, and places it at the specified coordinates in the given frame.
     - close_notification(self, frame=None, notification=None, like=False, idx=None): Closes a frame, should mainly be used for notifications. Also calls the `on_notification_qualified` function, to save the notification and 'liked?'.
-    - clear_plot(self): Deletes the plot widget and closes the plot via `PlotManager.close_plot()` for a smooth exit.
-    - create_plot(self): Disables the Dropdowns and calls `self.tracker.plot_manager.create_plot()`, using the current dropdown values.
+    - clear_plot(self): Deletes the plot widget.
+    - create_plot(self): Calls `self.tracker.plot_manager.create_plot()` with the current dropdown values, the plot is rendered in the background.
     - get_next_dropdown_values(self, current): Returns a list of values for the dropdown based on the given current selection.
     """
 
@@ -304,10 +305,10 @@ class TKManager:
         frame.destroy()
 
     def clear_plot(self):
-        """Deletes the plot widget and closes the plot via PlotManager.close_plot() for a smooth exit."""
+        """Deletes the plot widget (a label showing the rendered plot)."""
         if self.plot:
-            self.tracker.plot_manager.close_plot(self.plot)
-            self.plot.get_tk_widget().destroy()
+            self.plot.destroy()
+            self.plot = None
 
     @staticmethod
     def start_move(event, frame):
@@ -395,8 +396,9 @@ class TKManager:
                                                           command=lambda v=value: self.analysis_dropdown[1].set(v))
 
     def create_plot(self):
-        """Disables the Dropdowns and calls self.tracker.plot_manager.create_plot(), using the current dropdown values."""
-        self.set_dropdowns('disabled')
+        """Calls self.tracker.plot_manager.create_plot(), using the current dropdown values.
+        The plot is rendered in the plot worker thread and shown via show_plot, the dropdowns stay enabled meanwhile,
+        changing one again cancels the current plot."""
         self.tracker.plot_manager.create_plot(self.get_current_dropdown_values(), self.root)
 
     @staticmethod
@@ -441,14 +443,18 @@ class TKManager:
         if time:
             self.time_dropdown[0]['state'] = state
 
-    def show_plot(self, plot, plot_type):
-        """First clears the current plot if exists (by calling self.clear_plot), then places the new Plot
+    def show_plot(self, image, plot_type):
+        """First clears the current plot if exists (by calling self.clear_plot), then places the new Plot,
+        a label showing the image (the plot rendered as PNG bytes). If image is None (no data) the current plot stays.
         If plot_type equals 'heatmap' then don't enable part_dropdowns, otherwise enable all of them.
         This is to avoid any misconception over the part dropdowns not working, because they are NOT used in heatmap plots!
-        For further detail look into data_analysis/create_plot and data_analysis/create_tkinter_plot"""
-        self.clear_plot()
-        self.plot = plot
-        plot.get_tk_widget().place(x=40, y=325)
+        For further detail look into data_analysis/render_plot and data_analysis/create_figure"""
+        if image is not None:
+            self.clear_plot()
+            photo = tk.PhotoImage(data=base64.b64encode(image))
+            self.plot = tk.Label(self.root, image=photo, borderwidth=0, highlightthickness=0)
+            self.plot.image = photo  # Keep a reference, else the image is garbage collected
+            self.plot.place(x=40, y=325)
 
         # Enable Dropdowns, but dont enable part dropdowns if plot type is 'heatmap'
         if plot_type == 'heatmap':
@@ -1,17 +1,20 @@
 import datetime
 import threading
+import time
 
 from PIL import Image
 from pystray import Icon as TrayIcon, Menu as TrayMenu, MenuItem as TrayMenuItem
 
 from category import get_app_category
-from csv_util import save_data_to_csv, save_notification_to_csv
+from columnar import update_columnar
+from csv_util import apply_retention_to_csv_files, archive_csv_months, split_legacy_csv
 from data_analysis import PlotManager
 from menu_settings import *
 from notification import NotificationManager
 from settings import *
+from sql import CSVImporter
 from timemanager import TimeManager
-from util import get_activity_level
+from util import convert_last_data_to_dict, get_activity_level
 from winmanager import WinManager
 
 
@@ -28,16 +31,19 @@ class Tracker:
         auto_save_time: An integer representing the time interval for auto-saving data to SQL.
         csv_save_time: An integer representing the time interval for saving data to CSV.
         date_check_rate: An integer representing the time interval for checking the date.
+        retention_time: An integer representing the time interval for applying the retention policy.
+        retention_thread: The background thread applying the retention to the CSV files (without a writer thread), or None.
         last_app: A string representing the name of the last active application.
         last_data: A list representing the data of the last active application.
+        last_generation: The SQLLoader generation last_data was loaded at, if it is unchanged last_data isn't reloaded.
         reset: A boolean indicating whether the application should be reset.
 
     Methods:
         init_values(): Initializes most of the values of the Tracker class.
-        check_latest_data(): Updates self.last_data by setting it to self.load_all().
+        check_latest_data(): Updates self.last_data by setting it to self.load_all(), but only if the SQLLoader data changed.
         check_keyboard(): Creates a loop where check_keypress is executed permanently.
         check_app(): Checks if the app has changed or isn't set, and if so it updates and clears the current time_manager values.
-        check_autosave(): Manages the auto_save and csv_save times, saves them if the timers are finished (and resets the timers).
+        check_autosave(): Manages the auto_save and csv_save times, saves them if the timers are finished (and resets the timers). Also lets the SQLLoader and the CSVWriters flush their buffers.
         check_date(): Manages the date_check_timer, if reached zero then loads the new date.
         apply_time(): Loads the current time from SQL and then gives it to self.time_manager.
         start(): Starts all important threads and then runs the TKManager, which calls root.mainloop.
@@ -50,8 +56,13 @@ class Tracker:
         load_time(): Loads the current app data via self.get_current_app_data, then returns only the time_values.
         load_all(): Loads all values from SQL, then creates a list of all elements from the SQL Stats and returns it.
         save_all(): Saves the current app values for the chosen app, defaults to self.last_app (the currently opened one).
-        save_data_csv(): Saves self.last_data via a csv_util function as CSV File.
-        save_notification_csv(): Saves a notification with the given detail via a csv_util function as CSV File.
+        apply_retention(): Applies the RETENTION_TIERS to tracker.csv and the SQL history (downsampling old data), splits the unrotated tracker.csv into daily files, archives closed months, then updates the columnar history.
+        import_csv_history(): Imports the rows appended to notifications.csv into SQL (resumable, via a CSVImporter), for the Notifications plots.
+        flush_csv(force=False): Flushes the CSVWriters which reached their size or time threshold, then imports the new rows into SQL.
+        get_session(): Returns the running session (foreground interval) of the chosen app, like it would be logged.
+        save_session(): Appends the session (foreground interval) of the chosen app to the session log, and starts a new session.
+        save_data_csv(): Buffers self.last_data in the tracker CSVWriter.
+        save_notification_csv(): Buffers a notification with the given detail in the notification CSVWriter.
         on_notification_qualified(): Saves a notification with like information, calling self.save_notification_csv.
     """
 
@@ -70,6 +81,7 @@ class Tracker:
         self.time_manager = TimeManager(self)
         self.notification_manager = NotificationManager(self)
         self.plot_manager = PlotManager(self)
+        self.retention_thread = None
 
         self.init_values()
 
@@ -78,13 +90,19 @@ class Tracker:
         self.auto_save_time = SQL_SAVE_RATE
         self.csv_save_time = CSV_SAVE_RATE
         self.date_check_rate = DATE_CHECK_RATE
+        self.retention_time = RETENTION_RATE
         self.last_app = None
         self.last_data = None
+        self.last_generation = None
         self.reset = False
 
     def check_latest_data(self):
-        """Actualizes self.last_data by setting it to self.load_all()."""
-        self.last_data = self.load_all()
+        """Actualizes self.last_data by setting it to self.load_all().
+        Skipped if the generation of the SQLLoader didn't change since the last load (nothing was saved or cleared)."""
+        generation = self.app.loader.generation
+        if generation != self.last_generation:
+            self.last_data = self.load_all()
+            self.last_generation = generation
 
     def check_keyboard(self):
         """Creates a loop where check_keypress is executed permanently.
@@ -103,8 +121,10 @@ class Tracker:
             self.time_manager.on_app_swap(self.last_app)
             self.apply_time()
         if app and self.last_app != app:
-            self.last_app = app
+            # Save the times and the session of the previous app under its own name, before swapping
             self.save_all(self.last_app)
+            self.save_session(self.last_app)
+            self.last_app = app
             self.time_manager.on_app_swap(self.last_app)
 
             self.apply_time()
@@ -118,6 +138,12 @@ class Tracker:
         if self.auto_save_time <= 0:
             self.save_all()
             self.auto_save_time = SQL_SAVE_RATE
+        self.app.loader.check_flush()  # Writes the buffered SQL rows if SQL_FLUSH_RATE has passed
+        self.flush_csv()  # Writes the buffered CSV rows if CSV_FLUSH_SIZE or CSV_FLUSH_RATE is reached
+        self.retention_time -= 1
+        if self.retention_time <= 0:
+            self.apply_retention()
+            self.retention_time = RETENTION_RATE
         if self.csv_save_time <= 0:
             self.reset = True  # Will automatically Save everything
             self.csv_save_time = CSV_SAVE_RATE
@@ -128,10 +154,8 @@ class Tracker:
         self.date_check_rate -= 1
         if self.date_check_rate <= 0 and self.last_data:
             current_date = datetime.datetime.now().date()
-            saved_dates = [datetime.datetime.fromisoformat(self.last_data[i][2]).date() for i in
-                           range(len(self.last_data))]
-
-            last_saved_date = max(saved_dates)
+            # Timestamps are epoch seconds, so only the newest one has to be converted
+            last_saved_date = datetime.date.fromtimestamp(max(data[2] for data in self.last_data))
 
             if not (last_saved_date == current_date):
                 self.reset = True
@@ -261,23 +285,105 @@ class Tracker:
                  'opened_time': opened_time, 'active_time': active_time, 'total_active_time': total_active_time}
         self.app.loader.save_column('app_name', to_save, stats)
 
+    def apply_retention(self):
+        """Applies the RETENTION_TIERS to the tracker CSV files and the SQL history, so they don't grow without bound.
+        The unrotated tracker.csv (from before the daily rotation) is split into the daily files once.
+        Afterward the daily CSV files of closed months are compressed into monthly archives, and the closed days
+        (including the ones just changed) are converted into the columnar history (rollover).
+        If the SQLLoader has a writer thread, the files are processed there (after all queued writes, including CSV flushes),
+        otherwise in a background thread, so the startup and the tkinter thread aren't blocked by reading old files.
+        A run is skipped if the previous one is still running."""
+        tracker_abs_path = os.path.join(self.app.autostart_manager.current_abs_path[0], TRACKER_CSV_PATH)
+        notification_abs_path = os.path.join(self.app.autostart_manager.current_abs_path[0], NOTIFICATION_CSV_PATH)
+        columnar_abs_path = os.path.join(self.app.autostart_manager.current_abs_path[0], COLUMNAR_ROOT)
+        self.app.loader.apply_retention(RETENTION_TIERS)
+
+        def apply_to_files(db_manager=None):
+            try:
+                apply_retention_to_csv_files(tracker_abs_path, RETENTION_TIERS)
+                split_legacy_csv(self.app.tracker_csv)  # After the retention, so the daily files are downsampled already
+                archive_csv_months(tracker_abs_path)
+                archive_csv_months(notification_abs_path)
+                update_columnar(tracker_abs_path, columnar_abs_path)
+            except OSError as e:
+                print(f"Error applying the retention to the CSV files: {e}")
+
+        if self.app.loader.writer:
+            self.app.loader.writer.submit(apply_to_files)
+        elif not (self.retention_thread and self.retention_thread.is_alive()):
+            self.retention_thread = threading.Thread(target=apply_to_files, daemon=True)
+            self.retention_thread.start()
+
+    def import_csv_history(self):
+        """Imports the rows appended to the notification CSV files (all daily files) since the last import into the SQL
+        notification history, which the Notifications plots read. If the SQLLoader has a writer thread, the import is done
+        there (after the queued CSV flushes), otherwise at most IMPORT_ROWS_PER_TICK rows are imported per call (on the
+        tkinter thread), the rest by the next calls (after every CSV flush)."""
+        notification_abs_path = os.path.join(self.app.autostart_manager.current_abs_path[0], NOTIFICATION_CSV_PATH)
+
+        if self.app.loader.writer:
+            self.app.loader.writer.submit(
+                lambda db_manager: CSVImporter(db_manager).import_notification_files(notification_abs_path))
+        else:
+            CSVImporter(self.app.loader.db_manager, budget=IMPORT_ROWS_PER_TICK).import_notification_files(
+                notification_abs_path)
+
+    def get_session(self, app=None):
+        """Returns the running session (foreground interval until now) of the chosen app, defaults to self.last_app,
+        as dictionary with the SESSIONS_TABLE_COLUMNS (without id). None if there is no app or it started this second."""
+        to_save = app if app else self.last_app
+        end_time = int(time.time())
+        if not to_save or end_time <= self.time_manager.session_start:
+            return None
+
+        return {'app_name': to_save, 'category': get_app_category(to_save),
+                'start_time': self.time_manager.session_start, 'end_time': end_time,
+                'active_time': max(self.time_manager.session_active_time, 0),
+                'keypresses': self.time_manager.session_kp,
+                'activity': get_activity_level(self.time_manager.session_kpm)}
+
+    def save_session(self, app=None):
+        """Appends the session (foreground interval) of the chosen app to the append-only session log, defaults to self.last_app.
+        Then a new session is started, so every interval is only logged once."""
+        session = self.get_session(app)
+        if not session:
+            return
+
+        self.app.loader.append_session(session)
+        self.time_manager.reset_session()
+
+    def flush_csv(self, force=False):
+        """Flushes the CSVWriters which reached their size or time threshold (all if force), then imports the new rows into SQL.
+        If the SQLLoader has a writer thread, the files are written there, so the tkinter thread isn't blocked."""
+        writers = [writer for writer in (self.app.tracker_csv, self.app.notification_csv) if force or writer.needs_flush]
+        if not writers:
+            return
+
+        def flush(db_manager=None):
+            for writer in writers:
+                writer.flush()
+
+        if self.app.loader.writer:
+            self.app.loader.writer.submit(flush)
+        else:
+            flush()
+        self.import_csv_history()
+
     def save_data_csv(self):
-        """Saves self.last_data via a csv_util function as CSV File."""
-        data = self.last_data
-        abs_notification_path = os.path.join(self.app.autostart_manager.current_abs_path[0], TRACKER_CSV_PATH)
-        save_data_to_csv(abs_notification_path, data)
+        """Buffers self.last_data in the tracker CSVWriter, it is written to the daily file at the next flush_csv."""
+        if self.last_data:
+            self.app.tracker_csv.write_rows([convert_last_data_to_dict(data) for data in self.last_data])
 
     def save_notification_csv(self, not_text, not_type, like):
-        """Saves a notification with the given detail via a csv_util function as CSV File."""
+        """Buffers a notification with the given detail in the notification CSVWriter, it is written at the next flush_csv."""
         current_data = next((data for data in self.last_data if data[1] == self.last_app), None)
         if not current_data:
             return
-        data = {"id": current_data[0], "timestamp": current_data[2], "app_name": current_data[1],
+        data = {"id": current_data[0] or 0, "timestamp": current_data[2], "app_name": current_data[1],
                 "category": current_data[3], "activity": current_data[4], "opened_time": current_data[5],
                 "active_time": current_data[6], "total_active_time": current_data[7],
                 'notification_text': f"'{not_text}'", 'notification_type': f"'{not_type}'", 'like': like}
-        abs_notification_path = os.path.join(self.app.autostart_manager.current_abs_path[0], NOTIFICATION_CSV_PATH)
-        save_notification_to_csv(abs_notification_path, data)
+        self.app.notification_csv.write_rows([data])
 
     def on_notification_qualified(self, notification, like):
         """Saves a notification with like information, calling self.save_notification_csv."""
@@ -8,10 +8,17 @@ Functions:
 - convert_last_data_to_dict(last_data): Convert tracker last data into a dictionary.
 - convert_last_data_to_dataframe(last_data): Convert a data array into a pandas DataFrame.
 - get_productivity_by_category(category): Return the productivity level based on the provided app category.
+- get_productivity_by_categories(categories): Vectorized get_productivity_by_category for a Series of app categories.
 - get_productivity_score_by_category(category): Get the productivity score by category.
 - one_hot_encode(df, column): Encode a pd.DataFrame column by mapping its unique_indexes.
 - map_activity(activity): Map the activity to a numeric value.
+- map_activities(activities): Vectorized map_activity for a Series of activities.
 - percentage_of_str_in_other(small, big): Calculate the percentage of the first string that is present in the second string in correct order.
+- to_epoch(timestamp): Convert an isoformat string (or epoch seconds) into epoch seconds.
+- to_isoformat(timestamp): Convert epoch seconds (or an isoformat string) into an isoformat string.
+- get_bucket(timestamp, resolution): Return the start of the local hour or day of a timestamp, in epoch seconds.
+- get_retention_resolution(timestamp, tiers, now): Return the resolution the RETENTION_TIERS keep for a timestamp, None if it should be deleted.
+- largest_triangle_three_buckets(x, y, threshold): Return the positions of the points that downsample a series with LTTB, keeping its shape.
 
 Variables:
 - AUTOCLICKER: Threshold for detecting autoclickers.
@@ -21,11 +28,16 @@ Variables:
 - PASSIVE: Threshold for detecting passive users.
 - INACTIVE: Threshold for detecting inactive users.
 - PRODUCTIVITY_PER_CATEGORY: Dictionary mapping categories to productivity levels.
+- PRODUCTIVITY_LEVELS: All productivity levels, the categories of the categorical productivity column.
+- ACTIVITY_SCORES: Dictionary mapping the activity levels to their numeric values.
 - SQL_COLUMNS: List of SQL columns for the tracker data.
 - SQL_COLUMNS_WITH_ID: List of SQL columns for the tracker data, including the ID column.
 - SQL_COLUMNS_WITH_TIMESTAMP: List of SQL columns for the tracker data, including the timestamp column.
 """
 
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 
 from settings import *
@@ -93,8 +105,9 @@ def convert_last_data_to_dict(last_data):
     last_data[5]: opened_time
     last_data[6]: active_time
     last_data[7]: total_active_time
+    The id of rows which aren't flushed to SQL yet (None) is 0, SQL ids start at 1.
     """
-    return {"id": last_data[0], "timestamp": last_data[2], "app_name": last_data[1], "category": last_data[3],
+    return {"id": last_data[0] or 0, "timestamp": last_data[2], "app_name": last_data[1], "category": last_data[3],
             "activity": last_data[4], "opened_time": last_data[5], "active_time": last_data[6],
             "total_active_time": last_data[7]}
 
@@ -122,6 +135,8 @@ PRODUCTIVITY_PER_CATEGORY = {frozenset(('coding', 'developing', 'modeling',)): '
                              frozenset(('util', 'browser', 'communication',)): 'mediocre productivity',
                              frozenset(('social_media', 'entertainment', 'gaming', 'music',)): 'unproductive',
                              frozenset(('unknown',)): 'other'}
+PRODUCTIVITY_LEVELS = ('mediocre productivity', 'other', 'productive', 'unproductive')  # Sorted, like the strings were
+ACTIVITY_SCORES = {'autoclicker': 5, 'very_active': 4, 'active': 3, 'moderate': 2, 'passive': 1, 'inactive': 0}
 
 
 def get_productivity_by_category(category):
@@ -135,6 +150,19 @@ def get_productivity_by_category(category):
     return 'other'
 
 
+def get_productivity_by_categories(categories):
+    """
+    Vectorized get_productivity_by_category for a whole pd.Series of app categories (strings or categorical).
+    The productivity is only looked up once per distinct category (pd.factorize), the rows get it from a lookup array
+    indexed by their codes. Returns a categorical Series over PRODUCTIVITY_LEVELS (without the unused levels).
+    """
+    codes, uniques = pd.factorize(categories, use_na_sentinel=False)
+    lookup = np.array([PRODUCTIVITY_LEVELS.index(get_productivity_by_category(category)) for category in uniques],
+                      dtype=np.int8)
+    productivity = pd.Categorical.from_codes(lookup[codes], categories=PRODUCTIVITY_LEVELS)
+    return pd.Series(productivity, index=categories.index).cat.remove_unused_categories()
+
+
 def get_productivity_score_by_category(category):
     """
     Gets the productivity score by category, by mapping the result of util.get_productivity_by_category to numbers.
@@ -151,10 +179,8 @@ def get_productivity_score_by_category(category):
 
 
 def one_hot_encode(df, column):
-    """Encodes a pd.DataFrame column by mapping its unique_indexes."""
-    uniques = df[column].unique()
-    feature_map = {uniques[i]: i for i in range(len(uniques))}
-    df[column] = df[column].map(feature_map)
+    """Encodes a pd.DataFrame column by mapping its unique values to their index (in order of appearance), using pd.factorize."""
+    df[column] = pd.factorize(df[column], use_na_sentinel=False)[0]
     return df
 
 
@@ -166,8 +192,15 @@ def map_activity(activity):
     - moderate:     2
     - passive:      1
     - inactive:     0"""
-    mapping = {'autoclicker': 5, 'very_active': 4, 'active': 3, 'moderate': 2, 'passive': 1, 'inactive': 0}
-    return mapping.get(activity, -1)
+    return ACTIVITY_SCORES.get(activity, -1)
+
+
+def map_activities(activities):
+    """Vectorized map_activity for a whole pd.Series of activities (strings or categorical), the numeric values are only
+    looked up once per distinct activity (pd.factorize). Returns an int8 Series, -1 for unknown activities."""
+    codes, uniques = pd.factorize(activities, use_na_sentinel=False)
+    lookup = np.array([map_activity(activity) for activity in uniques], dtype=np.int8)
+    return pd.Series(lookup[codes], index=activities.index)
 
 
 def percentage_of_str_in_other(small, big):
@@ -182,3 +215,80 @@ def percentage_of_str_in_other(small, big):
             return 1
 
     return 0
+
+
+def to_epoch(timestamp):
+    """Converts an isoformat string (local time, like TimeManager.timestamp) into epoch seconds.
+    Numbers are already epoch seconds and are only converted to int."""
+    if isinstance(timestamp, str):
+        return int(datetime.fromisoformat(timestamp).timestamp())
+    return int(timestamp)
+
+
+def to_isoformat(timestamp):
+    """Converts epoch seconds (like the SQL timestamps) into an isoformat string (local time), like in the CSV files.
+    Strings are already in isoformat and are returned unchanged."""
+    if isinstance(timestamp, str):
+        return timestamp
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+def get_bucket(timestamp, resolution):
+    """
+    Returns the start of the local hour or day of the timestamp, in epoch seconds.
+    Args:
+        timestamp: Epoch seconds or an isoformat string.
+        resolution: 'hour' or 'day'.
+    Returns:
+        Start of the bucket in epoch seconds."""
+    moment = datetime.fromtimestamp(to_epoch(timestamp)).replace(minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        moment = moment.replace(hour=0)
+    return int(moment.timestamp())
+
+
+def get_retention_resolution(timestamp, tiers, now):
+    """
+    Returns the resolution the retention tiers keep for the timestamp ('full', 'hour' or 'day').
+    Args:
+        timestamp: Epoch seconds or an isoformat string.
+        tiers: Tiers of (max age in days, resolution), like RETENTION_TIERS. A max age of None never expires.
+        now: The current time in epoch seconds.
+    Returns:
+        The resolution, or None if the timestamp is older than all tiers (and should be deleted)."""
+    age_days = (now - to_epoch(timestamp)) / 86400
+    for max_age, resolution in tiers:
+        if max_age is None or age_days < max_age:
+            return resolution
+    return None
+
+
+def largest_triangle_three_buckets(x, y, threshold):
+    """
+    Downsamples a series to threshold points with Largest-Triangle-Three-Buckets (LTTB), which keeps its visual shape
+    (peaks and dips) unlike taking every n-th point. The first and last points are always kept, the points between them
+    are split into threshold - 2 buckets, and of each bucket the point forming the largest triangle with the previously
+    selected point and the average of the next bucket is selected.
+    Args:
+        x: The x values (numeric, sorted ascending), as NumPy array.
+        y: The numeric y values, as NumPy array.
+        threshold: Maximum number of points.
+    Returns:
+        The positions of the selected points (ascending), all positions if the series isn't longer than the threshold."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)  # Bucket i is [edges[i], edges[i + 1])
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n  # The next bucket of the last one is the last point
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected